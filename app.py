@@ -1,4 +1,5 @@
-from iot_remote_lab.server.app import app
+from iot_remote_lab.server.app import app, start_background_tasks
 
 if __name__ == "__main__":
+    start_background_tasks(use_reloader=True)
     app.run(debug=True, host="0.0.0.0")
@@ -0,0 +1,137 @@
+"""Admission control for expensive build and flash work"""
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+class AdmissionRejectedError(Exception):
+    """The resource's wait queue is full (or the wait timed out)"""
+
+    def __init__(self, resource: str, retry_after: int, reason: str = "queue full"):
+        super().__init__(f"{resource} is overloaded ({reason}), retry in {retry_after}s")
+        self.resource = resource
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class ResourcePool:
+    """Counting semaphore with a bounded FIFO wait queue.
+
+    Callers beyond ``limit`` wait in arrival order; once ``max_queue``
+    callers are waiting, new callers are rejected immediately with a
+    Retry-After estimate based on recent hold times.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max(0, max_queue)
+        self._lock = threading.Lock()
+        self._waiters: deque[threading.Event] = deque()
+        self._active = 0
+        self._admitted = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._avg_hold = 1.0
+        self._avg_wait = 0.0
+
+    def _retry_after_locked(self) -> int:
+        backlog = len(self._waiters) + 1
+        return max(1, math.ceil(self._avg_hold * backlog / self.limit))
+
+    def acquire(self, timeout: Optional[float] = None):
+        started = time.monotonic()
+        with self._lock:
+            if self._active < self.limit and not self._waiters:
+                self._active += 1
+                self._admitted += 1
+                return
+            if len(self._waiters) >= self.max_queue:
+                self._rejected += 1
+                raise AdmissionRejectedError(self.name, self._retry_after_locked())
+            ticket = threading.Event()
+            self._waiters.append(ticket)
+
+        ticket.wait(timeout)
+
+        with self._lock:
+            # release() may have handed us the slot right as the wait expired
+            if not ticket.is_set():
+                self._waiters.remove(ticket)
+                self._timed_out += 1
+                raise AdmissionRejectedError(
+                    self.name, self._retry_after_locked(), reason="wait timed out"
+                )
+            self._admitted += 1
+            waited = time.monotonic() - started
+            self._avg_wait = 0.8 * self._avg_wait + 0.2 * waited
+
+    def release(self, held: float = 0.0):
+        with self._lock:
+            if held:
+                self._avg_hold = 0.8 * self._avg_hold + 0.2 * held
+            if self._waiters:
+                # Hand the slot straight to the oldest waiter
+                self._waiters.popleft().set()
+            else:
+                self._active -= 1
+
+    @contextmanager
+    def slot(self, timeout: Optional[float] = None) -> Iterator[None]:
+        self.acquire(timeout)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "max_queue": self.max_queue,
+                "active": self._active,
+                "queue_depth": len(self._waiters),
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "avg_hold_seconds": self._avg_hold,
+                "avg_wait_seconds": self._avg_wait,
+            }
+
+
+class AdmissionController:
+    """Named resource pools, each with its own limit and wait queue"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools: dict[str, ResourcePool] = {}
+
+    def register(self, resource: str, limit: int, max_queue: int) -> ResourcePool:
+        with self._lock:
+            pool = ResourcePool(resource, limit, max_queue)
+            self._pools[resource] = pool
+            return pool
+
+    def pool(self, resource: str) -> ResourcePool:
+        with self._lock:
+            return self._pools[resource]
+
+    def slot(self, resource: str, timeout: Optional[float] = None):
+        return self.pool(resource).slot(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            pools = list(self._pools.values())
+        per_pool = {pool.name: pool.stats() for pool in pools}
+        return {
+            "pools": per_pool,
+            "queue_depth": sum(p["queue_depth"] for p in per_pool.values()),
+            "rejected": sum(
+                p["rejected"] + p["timed_out"] for p in per_pool.values()
+            ),
+        }
@@ -0,0 +1,389 @@
+"""Compile farm that builds PlatformIO projects away from the flashing path"""
+
+import abc
+import configparser
+import json
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
+
+try:
+    from supervisor import ProcessSupervisor
+except ImportError:
+    from .supervisor import ProcessSupervisor
+
+logger = logging.getLogger(__name__)
+
+
+class BuildError(Exception):
+    """A project failed to compile"""
+
+    def __init__(self, message: str, output: str = ""):
+        super().__init__(message)
+        self.output = output
+
+
+class WorkerUnavailableError(Exception):
+    """A worker could not take the job (network, shutdown); retry elsewhere"""
+
+
+def project_envs(project_dir: str) -> list[str]:
+    """Environment names declared in a project's platformio.ini"""
+    parser = configparser.ConfigParser()
+    parser.read(os.path.join(project_dir, "platformio.ini"))
+    return [s.split(":", 1)[1] for s in parser.sections() if s.startswith("env:")]
+
+
+def firmware_path(project_dir: str, env: str) -> str:
+    build_dir = os.path.join(project_dir, ".pio", "build", env)
+    for name in ("firmware.bin", "firmware.hex", "firmware.elf"):
+        candidate = os.path.join(build_dir, name)
+        if os.path.exists(candidate):
+            return candidate
+    return os.path.join(build_dir, "firmware.bin")
+
+
+@dataclass
+class BuildArtifact:
+    program: str
+    env: str
+    firmware_path: str
+    worker: str
+    duration: float
+
+
+@dataclass
+class BuildJob:
+    program: str
+    project_dir: str
+    env: str
+    submitted_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+    future: Future = field(default_factory=Future)
+
+
+class BuildWorker(abc.ABC):
+    """A build target with a fixed number of concurrent slots"""
+
+    def __init__(self, name: str, capacity: int = 1, warm_size: int = 32):
+        self.name = name
+        self.capacity = capacity
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.unavailable_until = 0.0
+        self._warm: OrderedDict[str, None] = OrderedDict()
+        self._warm_size = warm_size
+
+    def is_warm(self, program: str) -> bool:
+        return program in self._warm
+
+    def mark_warm(self, program: str):
+        self._warm[program] = None
+        self._warm.move_to_end(program)
+        while len(self._warm) > self._warm_size:
+            self._warm.popitem(last=False)
+
+    def has_free_slot(self, now: float) -> bool:
+        return self.active < self.capacity and now >= self.unavailable_until
+
+    @abc.abstractmethod
+    def build(self, job: BuildJob) -> BuildArtifact:
+        """Compile the job's project and return the firmware it produced"""
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "capacity": self.capacity,
+            "active": self.active,
+            "completed": self.completed,
+            "failed": self.failed,
+            "warm": list(self._warm),
+        }
+
+
+class LocalBuildWorker(BuildWorker):
+    """Builds in the project directory so its .pio tree stays warm.
+
+    All local workers share one PlatformIO object cache, so framework
+    objects compiled for one program are reused by every other program.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        capacity: int = 1,
+        object_cache_dir: Optional[str] = None,
+        supervisor: Optional[ProcessSupervisor] = None,
+    ):
+        super().__init__(name, capacity)
+        self._object_cache_dir = object_cache_dir
+        self._supervisor = supervisor or ProcessSupervisor()
+
+    def build(self, job: BuildJob) -> BuildArtifact:
+        env = dict(os.environ)
+        if self._object_cache_dir:
+            os.makedirs(self._object_cache_dir, exist_ok=True)
+            env["PLATFORMIO_BUILD_CACHE_DIR"] = self._object_cache_dir
+        started = time.monotonic()
+        result = self._supervisor.run(
+            ["platformio", "run", f"--project-dir={job.project_dir}", "-e", job.env],
+            profile="build",
+            label=f"build:{job.program}",
+            env=env,
+        )
+        if not result.ok:
+            raise BuildError(
+                f"Build of {job.program} failed ({result.exit_reason})",
+                result.output,
+            )
+        return BuildArtifact(
+            program=job.program,
+            env=job.env,
+            firmware_path=firmware_path(job.project_dir, job.env),
+            worker=self.name,
+            duration=time.monotonic() - started,
+        )
+
+
+class RemoteBuildWorker(BuildWorker):
+    """Ships the project to a build agent's /api/build and stores the result"""
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        pack_project: Callable[[str, str], Iterable[bytes]],
+        capacity: int = 1,
+        timeout: float = 600.0,
+        token: str = "",
+    ):
+        super().__init__(name, capacity)
+        self.url = url.rstrip("/")
+        self._pack_project = pack_project
+        self._timeout = timeout
+        self._token = token
+
+    def build(self, job: BuildJob) -> BuildArtifact:
+        query = urllib.parse.urlencode({"program": job.program, "env": job.env})
+        headers = {"Content-Type": "application/x-tar"}
+        if self._token:
+            headers["X-Build-Token"] = self._token
+        req = urllib.request.Request(
+            f"{self.url}/api/build?{query}",
+            data=self._pack_project(job.project_dir, job.program),
+            method="POST",
+            headers=headers,
+        )
+        started = time.monotonic()
+        dest = firmware_path(job.project_dir, job.env)
+        try:
+            with urllib.request.urlopen(req, timeout=self._timeout) as resp:
+                name = resp.headers.get("X-Firmware-Name") or os.path.basename(dest)
+                dest = os.path.join(os.path.dirname(dest), os.path.basename(name))
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                tmp = f"{dest}.part"
+                with open(tmp, "wb") as f:
+                    while True:
+                        chunk = resp.read(256 * 1024)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                os.replace(tmp, dest)
+        except urllib.error.HTTPError as e:
+            try:
+                payload = json.loads(e.read().decode("utf-8") or "{}")
+            except ValueError:
+                payload = {}
+            if e.code in (429, 503):
+                raise WorkerUnavailableError(f"{self.name} is overloaded ({e.code})")
+            raise BuildError(
+                payload.get("error") or f"Remote build failed with HTTP {e.code}",
+                payload.get("output", ""),
+            )
+        except (urllib.error.URLError, OSError) as e:
+            raise WorkerUnavailableError(f"{self.name} is unreachable: {e}")
+        return BuildArtifact(
+            program=job.program,
+            env=job.env,
+            firmware_path=dest,
+            worker=self.name,
+            duration=time.monotonic() - started,
+        )
+
+
+class BuildFarm:
+    """Pull-based build queue shared by local and remote workers.
+
+    Every worker slot runs a thread that pulls the next job. A worker
+    prefers jobs for programs it built recently (warm cache); a cold
+    worker only takes a job once no warm worker has a free slot or the
+    job has waited longer than ``affinity_grace`` seconds. Concurrent
+    requests for the same program and env share one build.
+    """
+
+    def __init__(
+        self,
+        workers: list[BuildWorker],
+        affinity_grace: float = 2.0,
+        max_attempts: int = 3,
+        retry_cooldown: float = 30.0,
+    ):
+        self._workers = workers
+        self._affinity_grace = affinity_grace
+        self._max_attempts = max_attempts
+        self._retry_cooldown = retry_cooldown
+        self._cond = threading.Condition()
+        self._pending: list[BuildJob] = []
+        self._inflight: dict[tuple[str, str], BuildJob] = {}
+        self._durations: list[float] = []
+        self._started = False
+
+    @property
+    def workers(self) -> list[BuildWorker]:
+        return self._workers
+
+    def start(self):
+        with self._cond:
+            if self._started:
+                return
+            self._started = True
+        for worker in self._workers:
+            for slot in range(worker.capacity):
+                threading.Thread(
+                    target=self._worker_loop,
+                    args=(worker,),
+                    name=f"build-{worker.name}-{slot}",
+                    daemon=True,
+                ).start()
+
+    def submit(self, project_dir: str, env: Optional[str] = None) -> Future:
+        program = os.path.basename(os.path.normpath(project_dir))
+        if not self._workers:
+            # Nothing would ever pull the job
+            future: Future = Future()
+            future.set_exception(BuildError("No build workers are configured"))
+            return future
+        if env is None:
+            envs = project_envs(project_dir)
+            if not envs:
+                future = Future()
+                future.set_exception(
+                    BuildError(f"No [env:...] section in {program}/platformio.ini")
+                )
+                return future
+            env = envs[0]
+        self.start()
+        with self._cond:
+            key = (os.path.abspath(project_dir), env)
+            job = self._inflight.get(key)
+            if job is None:
+                job = BuildJob(program=program, project_dir=project_dir, env=env)
+                self._inflight[key] = job
+                self._pending.append(job)
+                self._cond.notify_all()
+            return job.future
+
+    def build(self, project_dir: str, env: Optional[str] = None) -> BuildArtifact:
+        return self.submit(project_dir, env).result()
+
+    def _has_free_warm_worker(self, job: BuildJob, now: float) -> bool:
+        return any(
+            w.is_warm(job.program) and w.has_free_slot(now) for w in self._workers
+        )
+
+    def _take_job(self, worker: BuildWorker) -> BuildJob:
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if now >= worker.unavailable_until:
+                    chosen = None
+                    for job in self._pending:
+                        if worker.is_warm(job.program):
+                            chosen = job
+                            break
+                    if chosen is None:
+                        for job in self._pending:
+                            waited = now - job.submitted_at
+                            if (
+                                waited >= self._affinity_grace
+                                or not self._has_free_warm_worker(job, now)
+                            ):
+                                chosen = job
+                                break
+                    if chosen is not None:
+                        self._pending.remove(chosen)
+                        worker.active += 1
+                        return chosen
+                    timeout = self._affinity_grace if self._pending else None
+                else:
+                    timeout = worker.unavailable_until - now
+                self._cond.wait(timeout)
+
+    def _worker_loop(self, worker: BuildWorker):
+        while True:
+            job = self._take_job(worker)
+            job.attempts += 1
+            try:
+                artifact = worker.build(job)
+            except WorkerUnavailableError as e:
+                logger.warning(f"Build worker {worker.name} unavailable: {e}")
+                with self._cond:
+                    worker.active -= 1
+                    worker.unavailable_until = time.monotonic() + self._retry_cooldown
+                    if job.attempts < self._max_attempts:
+                        self._pending.insert(0, job)
+                    else:
+                        self._finish_locked(job, error=BuildError(str(e)))
+                    self._cond.notify_all()
+                continue
+            except Exception as e:
+                with self._cond:
+                    worker.active -= 1
+                    worker.failed += 1
+                    self._finish_locked(job, error=e)
+                    self._cond.notify_all()
+                continue
+
+            with self._cond:
+                worker.active -= 1
+                worker.completed += 1
+                worker.mark_warm(job.program)
+                self._durations = (self._durations + [artifact.duration])[-200:]
+                self._finish_locked(job, artifact=artifact)
+                self._cond.notify_all()
+            logger.info(
+                f"Built {job.program} on {worker.name} in {artifact.duration:.1f}s"
+            )
+
+    def _finish_locked(
+        self,
+        job: BuildJob,
+        artifact: Optional[BuildArtifact] = None,
+        error: Optional[BaseException] = None,
+    ):
+        self._inflight.pop((os.path.abspath(job.project_dir), job.env), None)
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(artifact)
+
+    def stats(self) -> dict:
+        with self._cond:
+            durations = list(self._durations)
+            return {
+                "pending": len(self._pending),
+                "inflight": len(self._inflight),
+                "workers": [w.to_dict() for w in self._workers],
+                "mean_build_seconds": (
+                    sum(durations) / len(durations) if durations else 0.0
+                ),
+            }
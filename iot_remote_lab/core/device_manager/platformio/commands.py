@@ -1,12 +1,22 @@
+import itertools
 import json
-import subprocess
+import threading
 
 try:
+    from build_farm import BuildArtifact, BuildFarm, LocalBuildWorker
     from model import Device, DeviceState
+    from supervisor import ProcessLimits, ProcessSupervisor
 except ImportError:
+    from .build_farm import BuildArtifact, BuildFarm, LocalBuildWorker
     from .model import Device, DeviceState
+    from .supervisor import ProcessLimits, ProcessSupervisor
 
 import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ..scheduler import LabScheduler
+    from ..store import StateStore
 
 """ Singleton class to manage devices using PlatformIO commands """
 
@@ -20,10 +30,21 @@ class DeviceManager:
         return cls._instance
 
     def __init__(self):
-        if not hasattr(self, "_initialized"):
-            self._initialized = True
+        # __init__ runs on every DeviceManager() call, keep the registry intact
+        if hasattr(self, "_initialized"):
+            return
+        self._initialized = True
         self._devices: list[Device] = []
         self._mock_devices: list[Device] = []
+        self._scheduler = None
+        self._build_farm: BuildFarm | None = None
+        self._supervisor: ProcessSupervisor | None = None
+        self._store: "StateStore | None" = None
+        self._versions = itertools.count(1)
+        self._registry_version = 0
+        self._scanned_at = 0.0
+        # One scan at a time, so a new port never gets two Device objects
+        self._scan_lock = threading.Lock()
 
     @property
     def devices(self) -> list[Device]:
@@ -31,37 +52,136 @@ class DeviceManager:
 
     @devices.setter
     def devices(self, value: list[Device]):
+        if value is not self._devices:
+            self._registry_version = next(self._versions)
         self._devices = value
 
-    def _get_connected_devices(self) -> list[dict[str, str | int]]:
-        try:
-            result = subprocess.run(
-                ["platformio", "device", "list", "--json-output"],
-                capture_output=True,
-                text=True,
-                check=True,
+    @property
+    def registry_version(self) -> int:
+        """Increases whenever a device is added, removed or changes state"""
+        return self._registry_version
+
+    def configure_scheduler(self, **options) -> "LabScheduler":
+        """Create the board scheduler, see LabScheduler for options"""
+        from ..scheduler import LabScheduler
+
+        self._scheduler = LabScheduler(lambda: self.devices, **options)
+        return self._scheduler
+
+    @property
+    def scheduler(self) -> "LabScheduler":
+        if self._scheduler is None:
+            return self.configure_scheduler()
+        return self._scheduler
+
+    def attach_store(self, store: "StateStore") -> list[Device]:
+        """Persist registry changes and restore the last known devices"""
+        self._store = store
+        restored: list[Device] = []
+        for row in store.load_devices():
+            try:
+                status = DeviceState(row["status"])
+            except ValueError:
+                status = DeviceState.UNKNOWN
+            if status == DeviceState.DISCONNECTED:
+                continue
+            # The previous process died mid-operation, the board needs a rescan
+            if status in (DeviceState.BUSY, DeviceState.MONITORING):
+                status = DeviceState.UNKNOWN
+            device = Device(
+                port=row["port"], description=row["description"], hwid=row["hwid"]
             )
+            device.status = status
+            device.watch(self._device_changed)
+            restored.append(device)
+        if restored and not self._devices:
+            self.devices = restored
+        return restored
 
-            # Parse JSON output
-            devices_data = json.loads(result.stdout)
-            return devices_data if isinstance(devices_data, list) else [devices_data]
-        except subprocess.CalledProcessError as e:
-            print(f"Error executing PlatformIO command: {e}")
-            return []
-        except FileNotFoundError:
+    def _device_changed(self, device: Device):
+        self._registry_version = next(self._versions)
+        if self._store is not None and device not in self._mock_devices:
+            self._store.upsert_device(
+                device.port,
+                device.description,
+                device.hwid,
+                device.board_type,
+                device.status.value,
+            )
+
+    def configure_supervisor(self, supervisor: ProcessSupervisor) -> ProcessSupervisor:
+        """Supervisor with "scan", "build" and "flash" limit profiles"""
+        self._supervisor = supervisor
+        return supervisor
+
+    @property
+    def supervisor(self) -> ProcessSupervisor:
+        if self._supervisor is None:
+            self._supervisor = ProcessSupervisor(
+                {
+                    "scan": ProcessLimits(timeout=30),
+                    "build": ProcessLimits(timeout=600),
+                    "flash": ProcessLimits(timeout=180),
+                }
+            )
+        return self._supervisor
+
+    def configure_build_farm(self, farm: BuildFarm) -> BuildFarm:
+        self._build_farm = farm
+        return farm
+
+    @property
+    def build_farm(self) -> BuildFarm:
+        if self._build_farm is None:
+            self._build_farm = BuildFarm(
+                [LocalBuildWorker("local", supervisor=self.supervisor)]
+            )
+        return self._build_farm
+
+    def build_firmware(self, build_path: str, env: str | None = None) -> BuildArtifact:
+        """Compile a project on the build farm, raises BuildError on failure"""
+        return self.build_farm.build(build_path, env or None)
+
+    def _get_connected_devices(self) -> list[dict[str, str | int]]:
+        result = self.supervisor.run(
+            ["platformio", "device", "list", "--json-output"],
+            profile="scan",
+            label="device-list",
+            capture_stderr=False,
+        )
+        if result.exit_reason == "not_found":
             print(
                 "PlatformIO not found. Please ensure PlatformIO is installed and in PATH."
             )
-            result = []
-            return result
+            return []
+        if not result.ok:
+            print(f"Error executing PlatformIO command: {result.exit_reason}")
+            return []
+        try:
+            # Parse JSON output
+            devices_data = json.loads(result.output)
+            return devices_data if isinstance(devices_data, list) else [devices_data]
         except json.JSONDecodeError as e:
             print(f"Error parsing PlatformIO JSON output: {e}")
-            result = []
-            return result
+            return []
+
+    def refresh_devices(self, max_age: float) -> list[Device]:
+        """Rescan only when the last scan is older than max_age seconds"""
+        with self._scan_lock:
+            # Callers that waited for a running scan reuse its result
+            if time.monotonic() - self._scanned_at < max_age and self.devices:
+                return self.devices
+            return self._scan_locked()
 
     def get_devices(self) -> list[Device]:
-        if len(self._devices) > 0:
-            self._devices.clear()
+        with self._scan_lock:
+            return self._scan_locked()
+
+    def _scan_locked(self) -> list[Device]:
+        self._scanned_at = time.monotonic()
+        # Reuse Device objects by port so status survives a rescan
+        known = {d.port: d for d in self._devices if d not in self._mock_devices}
+        scanned: list[Device] = []
         output: list[dict[str, str | int]] = self._get_connected_devices()
 
         for device_data in output:
@@ -73,21 +193,42 @@ class DeviceManager:
                 if not hwid.strip() or not description.strip() or len(hwid) < 5:
                     continue
                 # Only append unique devices based on port
-                if any(d.port == port for d in self._devices):
+                if any(d.port == port for d in scanned):
                     continue
-                self._devices.append(
-                    Device(port=port, description=description, hwid=hwid)
-                )
+                device = known.pop(port, None)
+                if device is None:
+                    device = Device(port=port, description=description, hwid=hwid)
+                    device.watch(self._device_changed)
+                    self._device_changed(device)
+                elif (device.description, device.hwid) != (description, hwid):
+                    device.description = description
+                    device.hwid = hwid
+                    self._device_changed(device)
+                if device.status in (DeviceState.UNKNOWN, DeviceState.DISCONNECTED):
+                    device.status = DeviceState.CONNECTED
+                scanned.append(device)
             except Exception as e:
                 print(f"Error processing device data {device_data}: {e}")
                 continue
 
-        return self.devices if len(self.devices) > 0 else self.get_mock_data()
+        # Whatever was not seen in this scan has been unplugged
+        for device in known.values():
+            device.status = DeviceState.DISCONNECTED
+        if not scanned:
+            # No real boards: the mock boards stay the registry between scans
+            scanned = self.get_mock_data()
+        if [id(d) for d in scanned] != [id(d) for d in self._devices]:
+            self.devices = scanned
+        return self.devices
 
     def get_mock_data(self) -> list[Device]:
-        if len(self._mock_devices) > 0:
-            return self._mock_devices
+        if len(self._mock_devices) == 0:
+            self._create_mock_devices()
+        if len(self.devices) == 0:
+            self.devices = self._mock_devices
+        return self._mock_devices
 
+    def _create_mock_devices(self):
         device_1 = Device(
             port="COM3",
             description="USB Serial Device",
@@ -106,9 +247,8 @@ class DeviceManager:
         self._mock_devices.append(device_1)
         self._mock_devices.append(device_2)
         self._mock_devices.append(device_3)
-        if len(self.devices) == 0:
-            self.devices = self._mock_devices
-        return self._mock_devices
+        for device in self._mock_devices:
+            device.watch(self._device_changed)
 
     def get_free_devices(self) -> list[Device]:
         return [
@@ -130,31 +270,40 @@ class DeviceManager:
     def upload_firmware(
         self, env: str, build_path: str, device: Device
     ) -> tuple[bool, str]:
-        if device.status != DeviceState.CONNECTED:
-            return False, "device is not connected"
         if device.status == DeviceState.BUSY:
             return False, "device is busy"
         if device.status == DeviceState.MONITORING:
             return False, "device is monitoring"
-        # port = device.port
+        if device.status not in (DeviceState.CONNECTED, DeviceState.USING):
+            return False, "device is not connected"
 
         # Set status to busy
         device.status = DeviceState.BUSY
 
-        proc = subprocess.Popen(
-            ["platformio", "run", f"--project-dir={build_path}"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-        )
-
-        # check in a loop
-        while proc.poll() is None:  # poll() returns None if still running
-            device.status = DeviceState.BUSY
-            time.sleep(1)
-        device.status = DeviceState.USING
-        print("Process ended with code:", proc.returncode)
-        return proc.returncode == 0, ""
+        # The build farm already produced the firmware, only flash it here
+        command = [
+            "platformio",
+            "run",
+            f"--project-dir={build_path}",
+            "--target=nobuild",
+            "--target=upload",
+            f"--upload-port={device.port}",
+        ]
+        if env:
+            command.append(f"--environment={env}")
+        try:
+            result = self.supervisor.run(
+                command, profile="flash", label=f"flash:{device.port}"
+            )
+        finally:
+            # Never leave the board BUSY, even if the flash was killed
+            device.status = DeviceState.USING
+        print(f"Upload ended with {result.exit_reason} code: {result.returncode}")
+        if result.exit_reason == "not_found":
+            return False, "PlatformIO not found"
+        if not result.ok:
+            return False, result.output[-2000:] or f"upload {result.exit_reason}"
+        return True, ""
 
     def get_device_by_port(self, port: str) -> Device:
         for device in self.get_devices():
@@ -1,6 +1,8 @@
 """This Will Handle all the data models"""
 
+import re
 from enum import Enum
+from typing import Callable, Optional
 
 
 class DeviceState(Enum):
@@ -19,6 +21,9 @@ class DeviceState(Enum):
     MONITORING = "monitoring"
 
 
+_VID_PID_RE = re.compile(r"VID:PID=([0-9A-Fa-f]{4}):([0-9A-Fa-f]{4})")
+
+
 class Device:
     _count = 0
 
@@ -28,6 +33,11 @@ class Device:
         self._hwid = hwid
         Device._count += 1
         self._status: DeviceState = DeviceState.CONNECTED
+        self._observer: Optional[Callable[["Device"], None]] = None
+
+    def watch(self, observer: Optional[Callable[["Device"], None]]):
+        """Call observer(device) whenever the status changes"""
+        self._observer = observer
 
     @property
     def status(self) -> DeviceState:
@@ -35,7 +45,10 @@ class Device:
 
     @status.setter
     def status(self, value: DeviceState):
+        changed = value != self._status
         self._status = value
+        if changed and self._observer is not None:
+            self._observer(self)
 
     @classmethod
     def get_count(cls):
@@ -65,11 +78,20 @@ class Device:
     def hwid(self, value):
         self._hwid = value
 
+    @property
+    def board_type(self) -> str:
+        """Board type as ``vid:pid`` taken from the hwid"""
+        match = _VID_PID_RE.search(self._hwid or "")
+        if not match:
+            return ""
+        return f"{match.group(1)}:{match.group(2)}".lower()
+
     def to_dict(self) -> dict:
         return {
             "port": self.port,
             "description": self.description,
             "hwid": self.hwid,
+            "board_type": self.board_type,
             "name": "ESP8266",
             "status": self.status.value,
         }
@@ -0,0 +1,355 @@
+"""Supervised execution of PlatformIO processes.
+
+Every PlatformIO call runs in its own process group with a wall-clock
+timeout, optional rlimits and an optional cgroup v2 memory/CPU cap. When a
+timeout expires the whole group is terminated, then killed, so compilers
+spawned by scons do not outlive the job.
+"""
+
+import itertools
+import logging
+import os
+import signal
+import subprocess
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Output kept per process; build logs can be large
+OUTPUT_TAIL = 64 * 1024
+KILL_GRACE = 5.0
+POLL_INTERVAL = 0.05
+
+# Allocation failures as reported by Python, gcc and libstdc++ once RLIMIT_AS
+# is hit; without a cgroup this is the only trace the memory cap leaves
+MEMORY_ERROR_MARKERS = (
+    "MemoryError",
+    "Cannot allocate memory",
+    "virtual memory exhausted",
+    "out of memory",
+    "std::bad_alloc",
+)
+
+_POSIX = os.name == "posix" and hasattr(os, "wait4")
+
+
+@dataclass
+class ProcessLimits:
+    timeout: Optional[float] = None
+    memory_bytes: int = 0
+    cpu_seconds: int = 0
+    cpu_quota: float = 0.0
+    """CPU cores allowed through the cgroup cpu.max controller"""
+
+
+@dataclass
+class ProcessResult:
+    label: str
+    command: list[str]
+    returncode: Optional[int]
+    exit_reason: str
+    output: str = ""
+    wall_time: float = 0.0
+    user_time: float = 0.0
+    system_time: float = 0.0
+    max_rss_kb: int = 0
+    started_at: float = field(default_factory=time.time)
+    limits: dict = field(default_factory=dict)
+    """Non-zero limits of the profile the process ran under"""
+
+    @property
+    def ok(self) -> bool:
+        return self.exit_reason == "ok"
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data.pop("output")
+        return data
+
+
+class ProcessSupervisor:
+    """Runs commands under named limit profiles and records their outcome"""
+
+    def __init__(
+        self,
+        profiles: Optional[dict[str, ProcessLimits]] = None,
+        cgroup_root: str = "",
+        history_size: int = 200,
+    ):
+        self._profiles = profiles or {}
+        self._cgroup_root = cgroup_root
+        self._history: deque[ProcessResult] = deque(maxlen=history_size)
+        self._reasons: Counter = Counter()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def limits(self, profile: str) -> ProcessLimits:
+        return self._profiles.get(profile, ProcessLimits())
+
+    def run(
+        self,
+        command: list[str],
+        profile: str = "default",
+        label: str = "",
+        env: Optional[dict[str, str]] = None,
+        cwd: Optional[str] = None,
+        capture_stderr: bool = True,
+    ) -> ProcessResult:
+        """Run a command to completion; output holds stdout (and stderr)"""
+        limits = self.limits(profile)
+        label = label or profile
+        stderr = subprocess.STDOUT if capture_stderr else subprocess.DEVNULL
+        started = time.monotonic()
+        try:
+            if _POSIX:
+                result = self._run_posix(command, label, limits, env, cwd, stderr)
+            else:
+                result = self._run_portable(command, label, limits, env, cwd, stderr)
+        except FileNotFoundError:
+            result = ProcessResult(label, command, None, "not_found")
+        result.wall_time = time.monotonic() - started
+        result.limits = {k: v for k, v in asdict(limits).items() if v}
+
+        with self._lock:
+            self._history.append(result)
+            self._reasons[result.exit_reason] += 1
+        if not result.ok:
+            logger.warning(
+                f"{label}: {' '.join(command[:3])} ended with {result.exit_reason} "
+                f"after {result.wall_time:.1f}s"
+            )
+        return result
+
+    # POSIX: own process group, rlimits, cgroup, wait4 rusage
+
+    def _run_posix(
+        self,
+        command: list[str],
+        label: str,
+        limits: ProcessLimits,
+        env: Optional[dict[str, str]],
+        cwd: Optional[str],
+        stderr: int,
+    ) -> ProcessResult:
+        cgroup = self._create_cgroup(label, limits)
+        try:
+            proc = subprocess.Popen(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=stderr,
+                env=env,
+                cwd=cwd,
+                start_new_session=True,
+                preexec_fn=self._child_setup(limits, cgroup),
+            )
+        except BaseException:
+            self._remove_cgroup(cgroup)
+            raise
+
+        chunks: deque[bytes] = deque()
+        size = [0]
+
+        def pump():
+            for chunk in iter(lambda: proc.stdout.read1(65536), b""):
+                chunks.append(chunk)
+                size[0] += len(chunk)
+                while size[0] - len(chunks[0]) >= OUTPUT_TAIL:
+                    size[0] -= len(chunks.popleft())
+
+        reader = threading.Thread(target=pump, name=f"supervise-{label}", daemon=True)
+        reader.start()
+
+        started = time.monotonic()
+        deadline = started + limits.timeout if limits.timeout else None
+        exit_reason = None
+        status = rusage = None
+        terminated_at = None
+        while True:
+            pid, status, rusage = os.wait4(proc.pid, os.WNOHANG)
+            if pid == proc.pid:
+                break
+            now = time.monotonic()
+            if deadline is not None and now >= deadline and terminated_at is None:
+                exit_reason = "timeout"
+                self._signal_group(proc.pid, signal.SIGTERM)
+                terminated_at = now
+            elif terminated_at is not None and now - terminated_at >= KILL_GRACE:
+                self._signal_group(proc.pid, signal.SIGKILL)
+                terminated_at = float("inf")
+            time.sleep(POLL_INTERVAL)
+
+        # Popen must not try to reap the pid again
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        if exit_reason == "timeout":
+            # Stragglers in the group would keep the pipe open
+            self._signal_group(proc.pid, signal.SIGKILL)
+        reader.join(KILL_GRACE)
+        proc.stdout.close()
+
+        output = b"".join(chunks)[-OUTPUT_TAIL:].decode("utf-8", "replace")
+        if exit_reason is None:
+            exit_reason = self._exit_reason(proc.returncode, cgroup, limits, output)
+        self._remove_cgroup(cgroup)
+
+        return ProcessResult(
+            label=label,
+            command=command,
+            returncode=proc.returncode,
+            exit_reason=exit_reason,
+            output=output,
+            user_time=rusage.ru_utime,
+            system_time=rusage.ru_stime,
+            max_rss_kb=rusage.ru_maxrss,
+        )
+
+    @staticmethod
+    def _signal_group(pid: int, sig: int):
+        try:
+            os.killpg(pid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    @staticmethod
+    def _child_setup(
+        limits: ProcessLimits, cgroup: Optional[str]
+    ) -> Optional[Callable[[], None]]:
+        """Caps applied in the child between fork and exec, so nothing escapes"""
+        rlimits = []
+        if resource is not None:
+            if limits.memory_bytes:
+                rlimits.append(
+                    (resource.RLIMIT_AS, (limits.memory_bytes, limits.memory_bytes))
+                )
+            if limits.cpu_seconds:
+                rlimits.append(
+                    (resource.RLIMIT_CPU, (limits.cpu_seconds, limits.cpu_seconds + 5))
+                )
+        procs = os.path.join(cgroup, "cgroup.procs") if cgroup else None
+        if not rlimits and procs is None:
+            return None
+
+        def setup():
+            # Only plain syscalls here: the parent may be multi-threaded
+            if procs is not None:
+                try:
+                    fd = os.open(procs, os.O_WRONLY)
+                    try:
+                        os.write(fd, b"0")
+                    finally:
+                        os.close(fd)
+                except OSError:
+                    pass
+            for which, value in rlimits:
+                try:
+                    resource.setrlimit(which, value)
+                except (ValueError, OSError):
+                    pass
+
+        return setup
+
+    def _create_cgroup(self, label: str, limits: ProcessLimits) -> Optional[str]:
+        if not self._cgroup_root or not (limits.memory_bytes or limits.cpu_quota):
+            return None
+        path = os.path.join(
+            self._cgroup_root, f"iotlab-{os.getpid()}-{next(self._ids)}"
+        )
+        try:
+            os.mkdir(path)
+            if limits.memory_bytes:
+                with open(os.path.join(path, "memory.max"), "w") as f:
+                    f.write(str(limits.memory_bytes))
+            if limits.cpu_quota:
+                period = 100000
+                with open(os.path.join(path, "cpu.max"), "w") as f:
+                    f.write(f"{int(limits.cpu_quota * period)} {period}")
+            return path
+        except OSError as e:
+            logger.warning(f"cgroup limits unavailable for {label}: {e}")
+            self._remove_cgroup(path)
+            return None
+
+    @staticmethod
+    def _remove_cgroup(path: Optional[str]):
+        if not path:
+            return
+        try:
+            os.rmdir(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _exit_reason(
+        returncode: int, cgroup: Optional[str], limits: ProcessLimits, output: str
+    ) -> str:
+        if returncode == 0:
+            return "ok"
+        if limits.memory_bytes and any(
+            marker in output[-4096:] for marker in MEMORY_ERROR_MARKERS
+        ):
+            return "memory_limit"
+        if returncode > 0:
+            return "error"
+        sig = -returncode
+        if sig == getattr(signal, "SIGXCPU", None):
+            return "cpu_limit"
+        if sig == signal.SIGKILL and cgroup:
+            try:
+                with open(os.path.join(cgroup, "memory.events")) as f:
+                    events = dict(line.split() for line in f if line.strip())
+                if int(events.get("oom_kill", 0)):
+                    return "memory_limit"
+            except (OSError, ValueError):
+                pass
+        try:
+            return f"signal:{signal.Signals(sig).name}"
+        except ValueError:
+            return "signal"
+
+    # Fallback for platforms without process groups / wait4
+
+    def _run_portable(
+        self,
+        command: list[str],
+        label: str,
+        limits: ProcessLimits,
+        env: Optional[dict[str, str]],
+        cwd: Optional[str],
+        stderr: int,
+    ) -> ProcessResult:
+        proc = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=stderr,
+            env=env,
+            cwd=cwd,
+        )
+        exit_reason = None
+        try:
+            output, _ = proc.communicate(timeout=limits.timeout)
+        except subprocess.TimeoutExpired:
+            exit_reason = "timeout"
+            proc.kill()
+            output, _ = proc.communicate()
+        return ProcessResult(
+            label=label,
+            command=command,
+            returncode=proc.returncode,
+            exit_reason=exit_reason or ("ok" if proc.returncode == 0 else "error"),
+            output=output[-OUTPUT_TAIL:].decode("utf-8", "replace"),
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "exit_reasons": dict(self._reasons),
+                "recent": [r.to_dict() for r in list(self._history)[-20:]],
+            }
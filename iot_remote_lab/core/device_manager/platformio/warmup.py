@@ -0,0 +1,243 @@
+"""Startup warm-up: install the toolchains templates need and pre-build them.
+
+A fresh host would otherwise download platforms and compile the whole
+framework during the first student's upload. The warmer installs the
+packages of every ``programs/template*`` project one at a time, then builds
+each template on the build farm. Local workers share one object cache, so
+programs created from a template reuse the framework objects compiled here.
+"""
+
+import configparser
+import glob
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional
+
+try:
+    from build_farm import BuildFarm, project_envs
+    from supervisor import ProcessSupervisor
+except ImportError:
+    from .build_farm import BuildFarm, project_envs
+    from .supervisor import ProcessSupervisor
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupState(Enum):
+    QUEUED = "queued"
+    INSTALLING = "installing"
+    BUILDING = "building"
+    READY = "ready"
+    FAILED = "failed"
+
+
+DONE_STATES = (WarmupState.READY, WarmupState.FAILED)
+
+
+def project_platforms(project_dir: str) -> set[str]:
+    """Platforms used by a project's environments (``[env]`` supplies defaults)"""
+    parser = configparser.ConfigParser()
+    parser.read(os.path.join(project_dir, "platformio.ini"))
+    default = parser.get("env", "platform", fallback="")
+    platforms = {
+        parser.get(section, "platform", fallback=default)
+        for section in parser.sections()
+        if section.startswith("env:")
+    }
+    return {p.strip() for p in platforms if p.strip()}
+
+
+@dataclass
+class TemplateWarmup:
+    name: str
+    project_dir: str
+    env: str
+    platforms: set[str]
+    state: WarmupState = WarmupState.QUEUED
+    error: str = ""
+    install_seconds: Optional[float] = None
+    build_seconds: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "state": self.state.value,
+            "env": self.env,
+            "platforms": sorted(self.platforms),
+            "error": self.error,
+            "install_seconds": self.install_seconds,
+            "build_seconds": self.build_seconds,
+        }
+
+
+class ToolchainWarmer:
+    """Background warm-up of every template matching ``pattern``.
+
+    Uploads check :meth:`is_ready` before building: a template is ready once
+    its own pre-build is done, any other program once the installs for its
+    platforms are finished. A failed warm-up does not block anyone; the real
+    build reports the error.
+    """
+
+    def __init__(
+        self,
+        programs_dir: str,
+        build_farm: BuildFarm,
+        supervisor: Optional[ProcessSupervisor] = None,
+        pattern: str = "template*",
+        install: bool = True,
+    ):
+        self._programs_dir = programs_dir
+        self._build_farm = build_farm
+        self._supervisor = supervisor or ProcessSupervisor()
+        self._pattern = pattern
+        self._install = install
+        self._cond = threading.Condition()
+        self._templates: dict[str, TemplateWarmup] = {}
+        # Outstanding template installs per platform
+        self._pending_installs: Counter = Counter()
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+
+    def discover(self) -> list[TemplateWarmup]:
+        templates = []
+        for ini in sorted(
+            glob.glob(os.path.join(self._programs_dir, self._pattern, "platformio.ini"))
+        ):
+            project_dir = os.path.normpath(os.path.dirname(ini))
+            envs = project_envs(project_dir)
+            if not envs:
+                logger.warning(f"Skipping warm-up of {project_dir}: no [env:...] section")
+                continue
+            templates.append(
+                TemplateWarmup(
+                    name=os.path.basename(project_dir),
+                    project_dir=project_dir,
+                    env=envs[0],
+                    platforms=project_platforms(project_dir),
+                )
+            )
+        return templates
+
+    def start(self) -> "ToolchainWarmer":
+        with self._cond:
+            if self._started_at is not None:
+                return self
+            self._started_at = time.monotonic()
+            for template in self.discover():
+                self._templates[template.name] = template
+                if self._install:
+                    self._pending_installs.update(template.platforms)
+        threading.Thread(target=self._run, name="toolchain-warmup", daemon=True).start()
+        return self
+
+    def _set_state(
+        self, template: TemplateWarmup, state: WarmupState, error: Optional[str] = None
+    ):
+        with self._cond:
+            template.state = state
+            if error is not None:
+                template.error = error
+            self._cond.notify_all()
+
+    def _run(self):
+        templates = list(self._templates.values())
+        logger.info(f"Warming up {len(templates)} templates")
+        try:
+            # Sequential, so two installers never write the same package directory
+            if self._install:
+                for template in templates:
+                    self._install_packages(template)
+
+            futures = []
+            for template in templates:
+                self._set_state(template, WarmupState.BUILDING)
+                futures.append(
+                    (template, self._build_farm.submit(template.project_dir, template.env))
+                )
+            for template, future in futures:
+                try:
+                    artifact = future.result()
+                except Exception as e:
+                    logger.warning(f"Warm-up build of {template.name} failed: {str(e)}")
+                    self._set_state(template, WarmupState.FAILED, str(e))
+                    continue
+                template.build_seconds = artifact.duration
+                self._set_state(template, WarmupState.READY)
+        except Exception as e:
+            logger.error(f"Warm-up aborted: {str(e)}")
+        finally:
+            # Never leave uploads waiting on a warm-up that is no longer running
+            with self._cond:
+                for template in templates:
+                    if template.state not in DONE_STATES:
+                        template.state = WarmupState.FAILED
+                        template.error = template.error or "Warm-up aborted"
+                self._pending_installs.clear()
+                self._finished_at = time.monotonic()
+                self._cond.notify_all()
+        logger.info(
+            f"Warm-up finished in {self._finished_at - self._started_at:.1f}s"
+        )
+
+    def _install_packages(self, template: TemplateWarmup):
+        self._set_state(template, WarmupState.INSTALLING)
+        started = time.monotonic()
+        result = self._supervisor.run(
+            [
+                "platformio",
+                "pkg",
+                "install",
+                f"--project-dir={template.project_dir}",
+                "-e",
+                template.env,
+            ],
+            profile="install",
+            label=f"install:{template.name}",
+        )
+        with self._cond:
+            template.install_seconds = time.monotonic() - started
+            if not result.ok:
+                # The build installs what it needs on demand; keep the reason
+                template.error = f"Package install failed ({result.exit_reason})"
+            self._pending_installs.subtract(template.platforms)
+            self._cond.notify_all()
+
+    def _is_ready_locked(self, project_dir: str) -> bool:
+        template = self._templates.get(os.path.basename(os.path.normpath(project_dir)))
+        if template is not None and template.project_dir == project_dir:
+            return template.state in DONE_STATES
+        return all(
+            self._pending_installs[p] <= 0 for p in project_platforms(project_dir)
+        )
+
+    @property
+    def installing(self) -> bool:
+        """Whether package installs are still running"""
+        with self._cond:
+            return any(count > 0 for count in self._pending_installs.values())
+
+    def is_ready(self, project_dir: str) -> bool:
+        """Whether a project can build without racing the warm-up"""
+        with self._cond:
+            return self._is_ready_locked(os.path.normpath(project_dir))
+
+    def status(self) -> dict:
+        with self._cond:
+            now = self._finished_at or time.monotonic()
+            return {
+                "ready": all(
+                    t.state in DONE_STATES for t in self._templates.values()
+                ),
+                "elapsed_seconds": (
+                    now - self._started_at if self._started_at is not None else 0.0
+                ),
+                "templates": {
+                    name: template.to_dict()
+                    for name, template in self._templates.items()
+                },
+            }
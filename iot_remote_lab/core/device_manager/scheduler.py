@@ -0,0 +1,436 @@
+"""Fair-share scheduler that hands lab boards to upload jobs"""
+
+import itertools
+import logging
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Callable, Optional
+
+from ..admission import AdmissionRejectedError
+from .platformio.model import Device, DeviceState
+
+logger = logging.getLogger(__name__)
+
+class PriorityClass(Enum):
+    """Lower value is served first"""
+
+    INSTRUCTOR = 0
+    STUDENT = 1
+
+    @classmethod
+    def parse(cls, value: Optional[str]) -> "PriorityClass":
+        if not value:
+            return cls.STUDENT
+        try:
+            return cls[value.strip().upper()]
+        except KeyError:
+            raise SchedulerError(f"Unknown priority class '{value}'")
+
+
+class JobState(Enum):
+    QUEUED = "queued"
+    PLACED = "placed"
+    DONE = "done"
+    CANCELLED = "cancelled"
+
+
+class SchedulerError(Exception):
+    """Base error for scheduling requests"""
+
+
+class QuotaExceededError(SchedulerError):
+    """The user already has as many jobs as their class allows"""
+
+
+class BookingConflictError(SchedulerError):
+    """A booking overlaps an existing booking on the same board"""
+
+
+class NoMatchingDeviceError(SchedulerError):
+    """No registered board matches the requested port or board type"""
+
+
+@dataclass
+class Booking:
+    booking_id: int
+    user: str
+    port: str
+    start: float
+    end: float
+
+    def active(self, now: float) -> bool:
+        return self.start <= now < self.end
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.booking_id,
+            "user": self.user,
+            "port": self.port,
+            "start": self.start,
+            "end": self.end,
+        }
+
+
+@dataclass
+class Job:
+    job_id: int
+    user: str
+    priority: PriorityClass
+    port: Optional[str] = None
+    board_type: Optional[str] = None
+    submitted_at: float = field(default_factory=time.monotonic)
+    placed_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    state: JobState = JobState.QUEUED
+    device: Optional[Device] = None
+
+    def wants(self, device: Device) -> bool:
+        if self.port and device.port.lower().strip() != self.port.lower().strip():
+            return False
+        if self.board_type and device.board_type != self.board_type.lower():
+            return False
+        return True
+
+    @property
+    def wait_seconds(self) -> Optional[float]:
+        end = self.placed_at or self.finished_at
+        return end - self.submitted_at if end is not None else None
+
+    @property
+    def hold_seconds(self) -> Optional[float]:
+        if self.placed_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.placed_at
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.job_id,
+            "user": self.user,
+            "priority": self.priority.name.lower(),
+            "port": self.device.port if self.device else self.port,
+            "board_type": self.board_type,
+            "state": self.state.value,
+        }
+
+
+class LabScheduler:
+    """Matches queued upload jobs to free, compatible boards.
+
+    Jobs are ordered by priority class, then by the user's decayed board
+    usage (so heavy users yield to light ones), then by submission time.
+    An active booking reserves a board for its owner only. Once
+    ``max_queue`` jobs are waiting, new jobs are rejected with
+    AdmissionRejectedError.
+    """
+
+    # Devices in these states can be handed to a new job
+    SCHEDULABLE_STATES = (DeviceState.CONNECTED, DeviceState.USING)
+
+    def __init__(
+        self,
+        device_source: Callable[[], list[Device]],
+        quotas: Optional[dict[PriorityClass, int]] = None,
+        max_bookings_per_user: int = 2,
+        usage_half_life: float = 3600.0,
+        history_size: int = 1000,
+        on_job_done: Optional[Callable[[Job], None]] = None,
+        max_queue: int = 0,
+    ):
+        self._device_source = device_source
+        self._max_queue = max_queue
+        self._on_job_done = on_job_done
+        self._quotas = quotas or {
+            PriorityClass.INSTRUCTOR: 4,
+            PriorityClass.STUDENT: 1,
+        }
+        self._max_bookings_per_user = max_bookings_per_user
+        self._usage_half_life = usage_half_life
+
+        self._cond = threading.Condition()
+        self._ids = itertools.count(1)
+        self._queue: list[Job] = []
+        self._running: dict[str, Job] = {}
+        self._bookings: dict[int, Booking] = {}
+        self._usage: dict[str, tuple[float, float]] = {}
+
+        self._started_at = time.monotonic()
+        self._busy_seconds: dict[str, float] = {}
+        self._latencies: deque[float] = deque(maxlen=history_size)
+        self._user_waits: dict[str, deque[float]] = {}
+        self._placed_count = 0
+        self._rejected_count = 0
+        self._avg_hold = 10.0
+
+    # Jobs
+
+    def check_candidate(
+        self, port: Optional[str] = None, board_type: Optional[str] = None
+    ):
+        """Raise NoMatchingDeviceError unless a registered board fits the job"""
+        probe = Job(0, "", PriorityClass.STUDENT, port=port, board_type=board_type)
+        if not any(
+            probe.wants(d)
+            for d in self._device_source()
+            if d.status != DeviceState.DISCONNECTED
+        ):
+            raise NoMatchingDeviceError(
+                f"No board matches port={port or '*'} board_type={board_type or '*'}"
+            )
+
+    def check_quota(
+        self, user: str, priority: PriorityClass = PriorityClass.STUDENT
+    ):
+        """Raise QuotaExceededError if the user cannot submit another job now"""
+        with self._cond:
+            self._check_quota_locked(user, priority)
+
+    def _check_quota_locked(self, user: str, priority: PriorityClass):
+        active = sum(
+            1
+            for j in itertools.chain(self._queue, self._running.values())
+            if j.user == user
+        )
+        if active >= self._quotas.get(priority, 1):
+            self._rejected_count += 1
+            raise QuotaExceededError(
+                f"User '{user}' already has {active} job(s) queued or running"
+            )
+
+    def submit(
+        self,
+        user: str,
+        priority: PriorityClass = PriorityClass.STUDENT,
+        port: Optional[str] = None,
+        board_type: Optional[str] = None,
+    ) -> Job:
+        with self._cond:
+            self._check_quota_locked(user, priority)
+            try:
+                self.check_candidate(port, board_type)
+            except NoMatchingDeviceError:
+                self._rejected_count += 1
+                raise
+            if self._max_queue and len(self._queue) >= self._max_queue:
+                self._rejected_count += 1
+                raise AdmissionRejectedError("flash", self._retry_after_locked())
+            job = Job(
+                job_id=next(self._ids),
+                user=user,
+                priority=priority,
+                port=port,
+                board_type=board_type,
+            )
+            self._queue.append(job)
+            self._dispatch_locked()
+            return job
+
+    def _retry_after_locked(self) -> int:
+        boards = sum(
+            1 for d in self._device_source() if d.status in self.SCHEDULABLE_STATES
+        )
+        backlog = len(self._queue) + 1
+        return max(1, math.ceil(self._avg_hold * backlog / max(1, boards)))
+
+    def wait_for_placement(self, job: Job, timeout: float) -> bool:
+        """Block until the job owns a board; cancel it if the timeout expires"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while job.state == JobState.QUEUED:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._cancel_locked(job)
+                    return False
+                # Wake up periodically so bookings that start or end get noticed
+                self._cond.wait(min(remaining, 1.0))
+                self._dispatch_locked()
+            return job.state == JobState.PLACED
+
+    def release(self, job: Job):
+        with self._cond:
+            self._release_locked(job)
+
+    def _release_locked(self, job: Job):
+        if job.state != JobState.PLACED:
+            return
+        now = time.monotonic()
+        job.state = JobState.DONE
+        job.finished_at = now
+        held = now - (job.placed_at or now)
+        port = job.device.port
+        self._running.pop(port, None)
+        self._busy_seconds[port] = self._busy_seconds.get(port, 0.0) + held
+        self._avg_hold = 0.8 * self._avg_hold + 0.2 * held
+        self._usage[job.user] = (self._decayed_usage(job.user, now) + held, now)
+        self._dispatch_locked()
+        self._job_done(job)
+
+    def cancel(self, job: Job):
+        with self._cond:
+            self._cancel_locked(job)
+
+    def _cancel_locked(self, job: Job):
+        if job.state == JobState.QUEUED:
+            self._queue.remove(job)
+            job.state = JobState.CANCELLED
+            job.finished_at = time.monotonic()
+            self._job_done(job)
+        elif job.state == JobState.PLACED:
+            self._release_locked(job)
+
+    def _job_done(self, job: Job):
+        if self._on_job_done is None:
+            return
+        try:
+            self._on_job_done(job)
+        except Exception as e:
+            logger.error(f"Job listener failed for job {job.job_id}: {e}")
+
+    # Bookings
+
+    def book(self, user: str, port: str, start: float, end: float) -> Booking:
+        if end <= start:
+            raise SchedulerError("Booking must end after it starts")
+        with self._cond:
+            now = time.time()
+            owned = [
+                b for b in self._bookings.values() if b.user == user and b.end > now
+            ]
+            if len(owned) >= self._max_bookings_per_user:
+                raise QuotaExceededError(
+                    f"User '{user}' already has {len(owned)} upcoming booking(s)"
+                )
+            for other in self._bookings.values():
+                if other.port == port and other.start < end and start < other.end:
+                    raise BookingConflictError(
+                        f"Port {port} is already booked by {other.user}"
+                    )
+            booking = Booking(next(self._ids), user, port, start, end)
+            self._bookings[booking.booking_id] = booking
+            return booking
+
+    def cancel_booking(self, booking_id: int, user: Optional[str] = None) -> bool:
+        with self._cond:
+            booking = self._bookings.get(booking_id)
+            if booking is None or (user is not None and booking.user != user):
+                return False
+            del self._bookings[booking_id]
+            self._cond.notify_all()
+            return True
+
+    def bookings(self) -> list[Booking]:
+        with self._cond:
+            now = time.time()
+            expired = [b.booking_id for b in self._bookings.values() if b.end <= now]
+            for booking_id in expired:
+                del self._bookings[booking_id]
+            return sorted(self._bookings.values(), key=lambda b: b.start)
+
+    # Placement
+
+    def _decayed_usage(self, user: str, now: float) -> float:
+        usage, updated = self._usage.get(user, (0.0, now))
+        return usage * 0.5 ** ((now - updated) / self._usage_half_life)
+
+    def _active_booking(self, port: str, now: float) -> Optional[Booking]:
+        for booking in self._bookings.values():
+            if booking.port == port and booking.active(now):
+                return booking
+        return None
+
+    def _dispatch_locked(self):
+        if not self._queue:
+            return
+        now = time.monotonic()
+        wall_now = time.time()
+        free = [
+            d
+            for d in self._device_source()
+            if d.status in self.SCHEDULABLE_STATES and d.port not in self._running
+        ]
+        if not free:
+            return
+
+        ordered = sorted(
+            self._queue,
+            key=lambda j: (
+                j.priority.value,
+                self._decayed_usage(j.user, now),
+                j.submitted_at,
+            ),
+        )
+        placed = False
+        for job in ordered:
+            for device in free:
+                if not job.wants(device):
+                    continue
+                booking = self._active_booking(device.port, wall_now)
+                if booking is not None and booking.user != job.user:
+                    continue
+                self._place_locked(job, device, now)
+                free.remove(device)
+                placed = True
+                break
+            if not free:
+                break
+        if placed:
+            self._cond.notify_all()
+
+    def _place_locked(self, job: Job, device: Device, now: float):
+        self._queue.remove(job)
+        job.state = JobState.PLACED
+        job.device = device
+        job.placed_at = now
+        self._running[device.port] = job
+        wait = now - job.submitted_at
+        self._latencies.append(wait)
+        self._user_waits.setdefault(job.user, deque(maxlen=100)).append(wait)
+        self._placed_count += 1
+        logger.info(
+            f"Placed job {job.job_id} for {job.user} on {device.port} after {wait:.2f}s"
+        )
+
+    # Metrics
+
+    @staticmethod
+    def _percentile(values: list[float], pct: float) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def stats(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            elapsed = max(now - self._started_at, 1e-9)
+            busy = dict(self._busy_seconds)
+            for port, job in self._running.items():
+                busy[port] = busy.get(port, 0.0) + now - (job.placed_at or now)
+            ports = {d.port for d in self._device_source()} | set(busy)
+            utilization = {p: min(1.0, busy.get(p, 0.0) / elapsed) for p in ports}
+            latencies = list(self._latencies)
+            return {
+                "queued": [j.to_dict() for j in self._queue],
+                "running": [j.to_dict() for j in self._running.values()],
+                "placed_total": self._placed_count,
+                "rejected_total": self._rejected_count,
+                "scheduling_latency": {
+                    "samples": len(latencies),
+                    "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+                    "p50": self._percentile(latencies, 50),
+                    "p95": self._percentile(latencies, 95),
+                    "max": max(latencies) if latencies else 0.0,
+                },
+                "user_wait_p95": {
+                    user: self._percentile(list(waits), 95)
+                    for user, waits in self._user_waits.items()
+                },
+                "board_utilization": utilization,
+                "pool_utilization": (
+                    sum(utilization.values()) / len(utilization) if utilization else 0.0
+                ),
+            }
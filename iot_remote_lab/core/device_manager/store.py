@@ -0,0 +1,268 @@
+"""SQLite (WAL) store for the device registry, jobs and upload history"""
+
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    port TEXT PRIMARY KEY,
+    description TEXT NOT NULL,
+    hwid TEXT NOT NULL,
+    board_type TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL,
+    user TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    port TEXT,
+    board_type TEXT,
+    state TEXT NOT NULL,
+    wait_seconds REAL,
+    hold_seconds REAL,
+    finished_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_user_finished ON jobs (user, finished_at);
+CREATE TABLE IF NOT EXISTS uploads (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    port TEXT NOT NULL,
+    board_type TEXT NOT NULL DEFAULT '',
+    program TEXT NOT NULL,
+    env TEXT NOT NULL DEFAULT '',
+    user TEXT NOT NULL DEFAULT '',
+    success INTEGER NOT NULL,
+    error TEXT NOT NULL DEFAULT '',
+    build_seconds REAL,
+    flash_seconds REAL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS uploads_port_created ON uploads (port, created_at DESC);
+CREATE INDEX IF NOT EXISTS uploads_board_type ON uploads (board_type, flash_seconds);
+"""
+
+_UPSERT_DEVICE = """
+INSERT INTO devices (port, description, hwid, board_type, status, updated_at)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(port) DO UPDATE SET
+    description = excluded.description,
+    hwid = excluded.hwid,
+    board_type = excluded.board_type,
+    status = excluded.status,
+    updated_at = excluded.updated_at
+"""
+
+_INSERT_JOB = """
+INSERT INTO jobs (job_id, user, priority, port, board_type, state,
+                  wait_seconds, hold_seconds, finished_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_INSERT_UPLOAD = """
+INSERT INTO uploads (port, board_type, program, env, user, success, error,
+                     build_seconds, flash_seconds, created_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+class StateStore:
+    """Embedded store; writes are queued and committed in batches.
+
+    Hot paths only enqueue a statement. A single writer thread drains the
+    queue every ``flush_interval`` seconds (or once ``batch_size`` rows are
+    waiting) and commits them in one transaction. Reads use a connection
+    per thread, which WAL lets run alongside the writer.
+    """
+
+    def __init__(
+        self, path: str, flush_interval: float = 0.5, batch_size: int = 256
+    ):
+        self._path = path
+        self._flush_interval = flush_interval
+        self._batch_size = batch_size
+        self._queue: queue.Queue = queue.Queue()
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+        self._stopped = threading.Event()
+        self._writer = threading.Thread(
+            target=self._write_loop, name="state-store-writer", daemon=True
+        )
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._path, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    # Batched writes
+
+    def _enqueue(self, sql: str, params: tuple):
+        self._queue.put((sql, params))
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            try:
+                first = self._queue.get(timeout=self._flush_interval)
+            except queue.Empty:
+                if self._stopped.is_set():
+                    break
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self._flush_interval
+            while len(batch) < self._batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit(conn, batch)
+        conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, batch: list):
+        events = [item for item in batch if isinstance(item, threading.Event)]
+        statements = [item for item in batch if not isinstance(item, threading.Event)]
+        try:
+            with conn:
+                for sql, params in statements:
+                    conn.execute(sql, params)
+        except sqlite3.Error as e:
+            logger.error(f"Dropped {len(statements)} state writes: {str(e)}")
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+            for event in events:
+                event.set()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until everything queued so far is committed"""
+        marker = threading.Event()
+        self._queue.put(marker)
+        return marker.wait(timeout)
+
+    def close(self):
+        if self._stopped.is_set():
+            return
+        self.flush()
+        self._stopped.set()
+
+    def upsert_device(
+        self, port: str, description: str, hwid: str, board_type: str, status: str
+    ):
+        self._enqueue(
+            _UPSERT_DEVICE,
+            (port, description, hwid, board_type, status, time.time()),
+        )
+
+    def record_job(
+        self,
+        job_id: int,
+        user: str,
+        priority: str,
+        port: Optional[str],
+        board_type: Optional[str],
+        state: str,
+        wait_seconds: Optional[float],
+        hold_seconds: Optional[float],
+    ):
+        self._enqueue(
+            _INSERT_JOB,
+            (
+                job_id,
+                user,
+                priority,
+                port,
+                board_type,
+                state,
+                wait_seconds,
+                hold_seconds,
+                time.time(),
+            ),
+        )
+
+    def record_upload(
+        self,
+        port: str,
+        board_type: str,
+        program: str,
+        env: str,
+        user: str,
+        success: bool,
+        error: str = "",
+        build_seconds: Optional[float] = None,
+        flash_seconds: Optional[float] = None,
+    ):
+        self._enqueue(
+            _INSERT_UPLOAD,
+            (
+                port,
+                board_type,
+                program,
+                env,
+                user,
+                int(success),
+                error[:2000],
+                build_seconds,
+                flash_seconds,
+                time.time(),
+            ),
+        )
+
+    # Queries
+
+    def _query(self, sql: str, params: tuple = ()) -> list[dict[str, Any]]:
+        return [dict(row) for row in self._reader().execute(sql, params)]
+
+    def load_devices(self) -> list[dict[str, Any]]:
+        return self._query("SELECT * FROM devices ORDER BY port")
+
+    def recent_uploads(self, port: str, limit: int = 10) -> list[dict[str, Any]]:
+        return self._query(
+            "SELECT * FROM uploads WHERE port = ? ORDER BY created_at DESC LIMIT ?",
+            (port, limit),
+        )
+
+    def average_flash_times(self) -> list[dict[str, Any]]:
+        return self._query(
+            """
+            SELECT board_type,
+                   COUNT(*) AS uploads,
+                   AVG(flash_seconds) AS avg_flash_seconds,
+                   AVG(build_seconds) AS avg_build_seconds,
+                   AVG(success) AS success_rate
+            FROM uploads
+            WHERE flash_seconds IS NOT NULL
+            GROUP BY board_type
+            ORDER BY board_type
+            """
+        )
+
+    def recent_jobs(self, user: str, limit: int = 10) -> list[dict[str, Any]]:
+        return self._query(
+            "SELECT * FROM jobs WHERE user = ? ORDER BY finished_at DESC LIMIT ?",
+            (user, limit),
+        )
@@ -1,30 +1,79 @@
-from flask import Flask, jsonify, render_template, request
+import hmac
+import io
+import os
+import threading
+import time
+from collections import defaultdict
+
+from flask import Flask, jsonify, render_template, request, send_file
 
 # from controllers.platformio_helper import device_list
 # from controllers.platformio_helper.devices import Device
 try:
     from config import get_config
     from exceptions import DeviceError, PlatformIOError
+    from federation import FederationCoordinator, parse_agents
     from utils.logging_config import get_logger, setup_logging
 
+    from iot_remote_lab.core.admission import (AdmissionController,
+                                               AdmissionRejectedError)
+    from iot_remote_lab.core.device_manager.platformio.build_farm import (
+        BuildError, BuildFarm, LocalBuildWorker, RemoteBuildWorker)
     from iot_remote_lab.core.device_manager.platformio.commands import \
         DeviceManager
     from iot_remote_lab.core.device_manager.platformio.model import (
         Device, DeviceState)
+    from iot_remote_lab.core.device_manager.platformio.supervisor import (
+        ProcessLimits, ProcessSupervisor)
+    from iot_remote_lab.core.device_manager.platformio.warmup import \
+        ToolchainWarmer
+    from iot_remote_lab.core.device_manager.scheduler import (
+        BookingConflictError, Job, NoMatchingDeviceError, PriorityClass,
+        QuotaExceededError, SchedulerError)
+    from iot_remote_lab.core.device_manager.store import StateStore
 except ImportError:
+    from ..core.admission import AdmissionController, AdmissionRejectedError
+    from ..core.device_manager.platformio.build_farm import (BuildError,
+                                                             BuildFarm,
+                                                             LocalBuildWorker,
+                                                             RemoteBuildWorker)
     from ..core.device_manager.platformio.commands import DeviceManager
     from ..core.device_manager.platformio.model import Device
+    from ..core.device_manager.platformio.supervisor import (ProcessLimits,
+                                                             ProcessSupervisor)
+    from ..core.device_manager.platformio.warmup import ToolchainWarmer
+    from ..core.device_manager.scheduler import (BookingConflictError, Job,
+                                                 NoMatchingDeviceError,
+                                                 PriorityClass,
+                                                 QuotaExceededError,
+                                                 SchedulerError)
+    from ..core.device_manager.store import StateStore
     from .config import get_config
     from .exceptions import DeviceError, PlatformIOError
+    from .federation import FederationCoordinator, parse_agents
     from .utils.logging_config import get_logger, setup_logging
 
 # Custom Imports
 try:
-    from utils.programms import (list_all_programs, load_program_from_file,
+    from utils.program_archive import (export_programs_archive,
+                                       import_programs_archive,
+                                       is_valid_program_name,
+                                       iter_project_entries, program_digest,
+                                       stream_tar, unpack_program_archive)
+    from utils.programms import (catalog_version, list_all_programs,
+                                 load_program_from_file, program_version,
                                  save_program_to_file)
+    from utils.response_cache import ResponseCache, uncached
 except ImportError:
-    from .utils.programms import (list_all_programs, load_program_from_file,
+    from .utils.program_archive import (export_programs_archive,
+                                        import_programs_archive,
+                                        is_valid_program_name,
+                                        iter_project_entries, program_digest,
+                                        stream_tar, unpack_program_archive)
+    from .utils.programms import (catalog_version, list_all_programs,
+                                  load_program_from_file, program_version,
                                   save_program_to_file)
+    from .utils.response_cache import ResponseCache, uncached
 
 # Initialize configuration and logging
 config = get_config()
@@ -36,11 +85,191 @@ app.config.from_object(config)
 
 # Singleton DeviceManager instance
 dmg = DeviceManager()
+# Every PlatformIO process runs under these limits
+dmg.configure_supervisor(
+    ProcessSupervisor(
+        {
+            "scan": ProcessLimits(timeout=config.PLATFORMIO_TIMEOUT),
+            "build": ProcessLimits(
+                timeout=config.BUILD_TIMEOUT,
+                memory_bytes=config.BUILD_MEMORY_LIMIT_MB * 1024 * 1024,
+                cpu_seconds=config.BUILD_CPU_SECONDS,
+                cpu_quota=config.BUILD_CPU_QUOTA,
+            ),
+            "flash": ProcessLimits(timeout=config.FLASH_TIMEOUT),
+            "install": ProcessLimits(timeout=config.INSTALL_TIMEOUT),
+        },
+        cgroup_root=config.SUPERVISOR_CGROUP_ROOT,
+    )
+)
+
+# Persistent registry and history, opened by start_background_tasks()
+store = None
+
+
+def _record_job(job: Job):
+    if store is None:
+        return
+    store.record_job(
+        job.job_id,
+        job.user,
+        job.priority.name.lower(),
+        job.device.port if job.device else job.port,
+        job.device.board_type if job.device else job.board_type,
+        job.state.value,
+        job.wait_seconds,
+        job.hold_seconds,
+    )
+
+
+dmg.configure_scheduler(
+    quotas={
+        PriorityClass.INSTRUCTOR: config.SCHEDULER_INSTRUCTOR_QUOTA,
+        PriorityClass.STUDENT: config.SCHEDULER_STUDENT_QUOTA,
+    },
+    max_bookings_per_user=config.SCHEDULER_MAX_BOOKINGS,
+    on_job_done=_record_job,
+    # Bounds uploads waiting for a board; which board is the scheduler's call
+    max_queue=config.ADMISSION_FLASH_QUEUE,
+)
+
+# Coordinator mode: aggregate the registries of other lab hosts
+federation = None
+if config.FEDERATION_AGENTS:
+    federation = FederationCoordinator(
+        parse_agents(config.FEDERATION_AGENTS),
+        refresh_interval=config.FEDERATION_REFRESH_INTERVAL,
+        stale_after=config.FEDERATION_STALE_AFTER,
+        timeout=config.FEDERATION_TIMEOUT,
+        # Worst case on the agent: build slot wait, build, board wait, flash
+        upload_timeout=config.ADMISSION_BUILD_WAIT
+        + config.BUILD_TIMEOUT
+        + config.SCHEDULER_WAIT_TIMEOUT
+        + config.FLASH_TIMEOUT
+        + 60,
+    )
+
+
+def _pack_project(project_dir: str, program_name: str):
+    return stream_tar(iter_project_entries(project_dir, program_name))
+
+
+def _build_workers() -> list:
+    """Local build slots plus remote build agents ("url" or "url#slots")"""
+    workers = []
+    if config.BUILD_WORKERS > 0:
+        workers.append(
+            LocalBuildWorker(
+                "local",
+                capacity=config.BUILD_WORKERS,
+                object_cache_dir=os.path.join(config.BUILD_CACHE_DIR, "objects"),
+                supervisor=dmg.supervisor,
+            )
+        )
+    for spec in config.BUILD_REMOTE_WORKERS.split(","):
+        if not spec.strip():
+            continue
+        url, _, slots = spec.strip().partition("#")
+        workers.append(
+            RemoteBuildWorker(
+                url,
+                url,
+                _pack_project,
+                capacity=int(slots or 1),
+                timeout=config.BUILD_TIMEOUT + 60,
+                token=config.BUILD_AGENT_TOKEN,
+            )
+        )
+    if not workers:
+        logger.warning(
+            "No build workers: set BUILD_WORKERS or BUILD_REMOTE_WORKERS, "
+            "every build will fail"
+        )
+    return workers
+
+
+dmg.configure_build_farm(
+    BuildFarm(_build_workers(), affinity_grace=config.BUILD_AFFINITY_GRACE)
+)
+# Bound concurrent builds/flashes and how many requests may wait for them
+admission = AdmissionController()
+admission.register(
+    "build",
+    limit=config.ADMISSION_BUILD_CONCURRENCY
+    or sum(w.capacity for w in dmg.build_farm.workers),
+    max_queue=config.ADMISSION_BUILD_QUEUE,
+)
+
+# Install template toolchains and pre-build templates before the first upload
+warmer = ToolchainWarmer(
+    os.path.join(os.getcwd(), "programs"),
+    dmg.build_farm,
+    supervisor=dmg.supervisor,
+    pattern=config.WARMUP_PATTERN,
+    install=config.BUILD_WORKERS > 0,
+)
+
+_background_lock = threading.Lock()
+_background_started = False
+
+
+def start_background_tasks(use_reloader: bool = False):
+    """Open the state store and start the federation poller and warm-up.
+
+    Runs once per serving process. Under the Werkzeug reloader the parent
+    process only watches files, so only the child (WERKZEUG_RUN_MAIN) starts
+    anything.
+    """
+    global store, _background_started
+    if use_reloader and os.environ.get("WERKZEUG_RUN_MAIN") != "true":
+        return
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+        if config.STATE_DB_PATH:
+            # Restores the last known boards
+            store = StateStore(
+                config.STATE_DB_PATH, flush_interval=config.STATE_FLUSH_INTERVAL
+            )
+            restored = dmg.attach_store(store)
+            logger.info(
+                f"Restored {len(restored)} devices from {config.STATE_DB_PATH}"
+            )
+        if federation is not None:
+            federation.start()
+        elif config.WARMUP_ENABLED:
+            warmer.start()
+
+# Serializes unpack + build per program on a build agent
+_build_locks: defaultdict[str, threading.Lock] = defaultdict(threading.Lock)
+
+# Rendered pages and API bodies, keyed on the data they were built from
+response_cache = ResponseCache(max_entries=config.RESPONSE_CACHE_SIZE)
+
+
+def _registry_version(**_):
+    return dmg.registry_version
+
+
+def _device_list_version(**_):
+    if federation is not None:
+        return federation.version
+    # Scans are throttled, so repeat hits only read the registry version
+    dmg.refresh_devices(config.DEVICE_SCAN_INTERVAL)
+    return dmg.registry_version
+
+
+def _catalog_version(**_):
+    return catalog_version()
+
+
+def _program_version(program_name: str):
+    return program_version(program_name)
+
 
 # Serve static files in development
 if app.config.get("ENV") != "production":
-    import os
-
     from werkzeug.middleware.shared_data import SharedDataMiddleware
 
     app.wsgi_app = SharedDataMiddleware(
@@ -48,12 +277,20 @@ if app.config.get("ENV") != "production":
     )
 
 
+@app.before_request
+def _ensure_background_tasks():
+    # WSGI servers never call main(); start on the first request instead
+    if not _background_started:
+        start_background_tasks()
+
+
 @app.route("/healthz")
 def healthz():
     return jsonify({"ok": True}), 200
 
 
 @app.route("/")
+@response_cache.cached(_registry_version)
 def home():
     """Home page displaying ESP devices"""
     try:
@@ -66,15 +303,18 @@ def home():
 
     except (DeviceError, PlatformIOError) as e:
         logger.error(f"Device error on home page: {str(e)}")
-        return render_template("home.html", devices=[], error=str(e))
+        return uncached(render_template("home.html", devices=[], error=str(e)))
 
     except Exception as e:
         logger.error(f"Unexpected error on home page: {str(e)}")
         # Fall back to the main home template to avoid TemplateNotFound
-        return render_template("home.html", devices=[], error="Failed to load devices")
+        return uncached(
+            render_template("home.html", devices=[], error="Failed to load devices")
+        )
 
 
 @app.route("/new")
+@response_cache.cached(_registry_version)
 def new_home():
     try:
         logger.info("Loading home page with device list")
@@ -85,26 +325,34 @@ def new_home():
 
     except (DeviceError, PlatformIOError) as e:
         logger.error(f"Device error on home page: {str(e)}")
-        return render_template("home.html", devices=[], error=str(e))
+        return uncached(render_template("home.html", devices=[], error=str(e)))
 
     except Exception as e:
         logger.error(f"Unexpected error on home page: {str(e)}")
         # Fall back to the main home template to avoid TemplateNotFound
-        return render_template("home.html", devices=[], error="Failed to load devices")
+        return uncached(
+            render_template("home.html", devices=[], error="Failed to load devices")
+        )
 
 
 @app.route("/api/devices", methods=["GET"])
+@response_cache.cached(_device_list_version)
 def get_devices():
     """Get list of connected devices"""
     try:
         logger.info("Requesting device list")
-        # Use real device list if available; otherwise fall back to mock
-        try:
-            devices: list[Device] = dmg.get_devices()
-        except Exception:
-            logger.warning("Falling back to mock device data for /api/devices")
-            devices = dmg.get_mock_data()
-        json_devices = [device.to_dict() for device in devices]
+        if federation is not None:
+            json_devices = federation.devices()
+        else:
+            # Use real device list if available; otherwise fall back to mock
+            try:
+                devices: list[Device] = dmg.refresh_devices(
+                    config.DEVICE_SCAN_INTERVAL
+                )
+            except Exception:
+                logger.warning("Falling back to mock device data for /api/devices")
+                devices = dmg.get_mock_data()
+            json_devices = [device.to_dict() for device in devices]
 
         logger.info(f"Returning {len(json_devices)} devices")
         return jsonify(
@@ -135,6 +383,7 @@ def get_devices():
 
 
 @app.route("/devices")
+@response_cache.cached(_registry_version)
 def device_list_page():
     """Device list page"""
     try:
@@ -146,12 +395,14 @@ def device_list_page():
 
     except (DeviceError, PlatformIOError) as e:
         logger.error(f"Device error on device list page: {str(e)}")
-        return render_template("device_list.html", devices=[], error=str(e))
+        return uncached(render_template("device_list.html", devices=[], error=str(e)))
 
     except Exception as e:
         logger.error(f"Unexpected error on device list page: {str(e)}")
-        return render_template(
-            "device_list.html", devices=[], error="Failed to load devices"
+        return uncached(
+            render_template(
+                "device_list.html", devices=[], error="Failed to load devices"
+            )
         )
 
 
@@ -185,34 +436,107 @@ def save_program():
 
 
 @app.route("/api/load_program/<program_name>")
+@response_cache.cached(_program_version)
 def load_program(program_name):
     return load_program_from_file(logger, program_name)
 
 
 @app.route("/api/list_programs")
+@response_cache.cached(_catalog_version)
 def list_programs():
     return list_all_programs(logger)
 
 
+@app.route("/api/programs/export", methods=["GET"])
+def export_programs():
+    """Stream programs as a tar/zip archive (?format=tar|zip&programs=a,b)"""
+    return export_programs_archive(logger)
+
+
+@app.route("/api/programs/import", methods=["POST"])
+def import_programs():
+    """Unpack a tar/zip archive of programs into the program store"""
+    return import_programs_archive(logger)
+
+
 @app.route("/api/health", methods=["GET"])
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint, with per-template warm-up readiness"""
+    warmup = warmer.status()
     return jsonify(
         {
             "success": True,
-            "status": "healthy",
+            "status": "healthy" if warmup["ready"] else "warming_up",
             "message": "IoT Remote Lab server is running",
+            "warmup": warmup,
         }
     )
 
 
+def _request_user(data: dict) -> str:
+    """Identify the caller, falling back to the client address"""
+    user = (data or {}).get("user") or request.headers.get("X-Lab-User")
+    return str(user or request.remote_addr or "anonymous").strip()
+
+
+def _request_priority(data: dict) -> PriorityClass:
+    """Instructor priority needs the instructor token; without one it is off"""
+    priority = PriorityClass.parse((data or {}).get("priority"))
+    if priority == PriorityClass.INSTRUCTOR and not (
+        config.INSTRUCTOR_TOKEN
+        and hmac.compare_digest(
+            request.headers.get("X-Instructor-Token", ""), config.INSTRUCTOR_TOKEN
+        )
+    ):
+        raise SchedulerError("Instructor priority requires a valid instructor token")
+    return priority
+
+
+def _scheduler_error_response(e: SchedulerError):
+    if isinstance(e, QuotaExceededError):
+        status = 429
+    elif isinstance(e, BookingConflictError):
+        status = 409
+    elif isinstance(e, NoMatchingDeviceError):
+        status = 404
+    else:
+        status = 400
+    return (
+        jsonify({"success": False, "error": str(e), "type": "scheduler_error"}),
+        status,
+    )
+
+
+def _warming_up_response(program_name: str):
+    response = jsonify(
+        {
+            "success": False,
+            "error": f"Toolchain for {program_name} is still warming up",
+            "type": "warming_up",
+            "warmup": warmer.status(),
+        }
+    )
+    response.headers["Retry-After"] = "30"
+    return response, 503
+
+
 @app.route("/api/upload_firmware", methods=["POST"])
 def upload_firmware():
-    """Upload firmware to a device"""
-    # try:
-    data = request.get_json()
+    """Upload firmware to a device once the scheduler hands it a board"""
+    data = request.get_json() or {}
+    if federation is not None:
+        headers = dict(request.headers)
+        headers.setdefault("X-Lab-User", _request_user(data))
+        payload, status = federation.forward_upload(data, headers)
+        response = jsonify(payload)
+        if status == 429 and payload.get("retry_after"):
+            response.headers["Retry-After"] = str(payload["retry_after"])
+        return response, status
+
     device: dict[str, str] = data.get("device", {})
-    if not device or "port" not in device:
+    if not isinstance(device, dict) or not (
+        device.get("port") or device.get("board_type")
+    ):
         return (
             jsonify(
                 {
@@ -224,14 +548,9 @@ def upload_firmware():
             400,
         )
 
-    program_name: str = data.get("program_name")
-    port: str = device.get("port").strip()
-    print("device is", port)
-    device_obj = dmg.get_device_by_port(port.strip())
-    print("device obj is", device_obj, " ids", id(device_obj))
-
+    program_name: str = data.get("program_name") or ""
     path = os.path.join(os.getcwd(), "programs", program_name)
-    if not os.path.exists(path):
+    if not is_valid_program_name(program_name) or not os.path.isdir(path):
         return (
             jsonify(
                 {
@@ -242,7 +561,104 @@ def upload_firmware():
             ),
             404,
         )
-    status, err = dmg.upload_firmware(device=device_obj, build_path=path, env="")
+    # A federation coordinator sends its copy's digest so edits get pushed
+    expected_digest = data.get("program_digest")
+    if expected_digest and program_digest(program_name) != expected_digest:
+        return (
+            jsonify(
+                {
+                    "success": False,
+                    "error": f"Program {program_name} differs from the coordinator's",
+                    "type": "program_outdated",
+                }
+            ),
+            409,
+        )
+
+    # Fail fast on a bad priority, an exhausted quota or a board that does
+    # not exist instead of finding out after the build
+    user = _request_user(data)
+    port: str = (device.get("port") or "").strip()
+    dmg.refresh_devices(config.DEVICE_SCAN_INTERVAL)
+    try:
+        priority = _request_priority(data)
+        dmg.scheduler.check_quota(user, priority)
+        dmg.scheduler.check_candidate(port or None, device.get("board_type"))
+    except SchedulerError as e:
+        return _scheduler_error_response(e)
+
+    # Never hold a request open behind the startup warm-up or race the
+    # package installer; the client retries after Retry-After
+    if not warmer.is_ready(path):
+        return _warming_up_response(program_name)
+
+    # Compile before asking for a board so nobody holds a board while building
+    try:
+        with admission.slot("build", timeout=config.ADMISSION_BUILD_WAIT):
+            artifact = dmg.build_firmware(path)
+    except BuildError as e:
+        logger.warning(f"Build of {program_name} failed: {str(e)}")
+        return (
+            jsonify(
+                {
+                    "success": False,
+                    "error": str(e),
+                    "output": e.output[-4000:],
+                    "type": "build_error",
+                }
+            ),
+            422,
+        )
+
+    # Rescan (throttled) so boards plugged in during the build can be placed
+    dmg.refresh_devices(config.DEVICE_SCAN_INTERVAL)
+
+    try:
+        job = dmg.scheduler.submit(
+            user=user,
+            priority=priority,
+            port=port or None,
+            board_type=device.get("board_type"),
+        )
+    except SchedulerError as e:
+        return _scheduler_error_response(e)
+
+    if not dmg.scheduler.wait_for_placement(job, config.SCHEDULER_WAIT_TIMEOUT):
+        return (
+            jsonify(
+                {
+                    "success": False,
+                    "error": "Timed out waiting for a free board",
+                    "type": "scheduler_timeout",
+                }
+            ),
+            503,
+        )
+
+    flash_started = time.monotonic()
+    try:
+        logger.info(
+            f"Job {job.job_id} uploading {program_name} to {job.device.port}"
+        )
+        status, err = dmg.upload_firmware(
+            device=job.device, build_path=path, env=artifact.env
+        )
+    finally:
+        dmg.scheduler.release(job)
+
+    if store is not None:
+        store.record_upload(
+            port=job.device.port,
+            board_type=job.device.board_type,
+            program=program_name,
+            env=artifact.env,
+            user=job.user,
+            success=status and err == "",
+            error=err,
+            build_seconds=artifact.duration,
+            flash_seconds=time.monotonic() - flash_started,
+        )
+
     if err != "" or not status:
         return (
             jsonify(
@@ -254,14 +670,188 @@ def upload_firmware():
             ),
             500,
         )
-    print(status, err)
-    print("path is", path)
     return jsonify(
         {
             "success": status,
-            "message": f"Firmware upload {device} with program {program_name} initiated",
+            "message": f"Firmware upload {job.device.port} with program {program_name} initiated",
+            "port": job.device.port,
+            "job": job.to_dict(),
+        }
+    )
+
+
+@app.route("/api/build", methods=["POST"])
+def build_program():
+    """Build agent: compile an uploaded project tar and return its firmware"""
+    # Projects run arbitrary build scripts, so only token holders may build
+    if not (config.BUILD_AGENT_ENABLED and config.BUILD_AGENT_TOKEN):
+        return jsonify({"success": False, "error": "Build agent is disabled"}), 404
+    if not hmac.compare_digest(
+        request.headers.get("X-Build-Token", ""), config.BUILD_AGENT_TOKEN
+    ):
+        return jsonify({"success": False, "error": "Invalid build token"}), 403
+
+    program_name = request.args.get("program", "")
+    if not is_valid_program_name(program_name):
+        return jsonify({"success": False, "error": "Invalid program name"}), 400
+
+    # Never hold a build slot while the installer runs; remote build workers
+    # cool down on 503 and retry elsewhere
+    if warmer.installing:
+        return _warming_up_response(program_name)
+
+    projects_dir = os.path.join(config.BUILD_CACHE_DIR, "projects")
+    with admission.slot(
+        "build", timeout=config.ADMISSION_BUILD_WAIT
+    ), _build_locks[program_name]:
+        try:
+            # Keep the previous .pio tree so rebuilds are incremental
+            imported, _, rejected = unpack_program_archive(
+                request.stream,
+                "tar",
+                projects_dir,
+                overwrite=True,
+                workers=config.ARCHIVE_IO_WORKERS,
+                max_file_size=config.ARCHIVE_MAX_FILE_SIZE,
+                preserve=(".pio",),
+            )
+        except Exception as e:
+            logger.warning(f"Rejected build project {program_name}: {str(e)}")
+            return jsonify({"success": False, "error": str(e)}), 400
+        if program_name not in imported:
+            error = rejected[0]["error"] if rejected else "project missing"
+            return jsonify({"success": False, "error": error}), 400
+
+        project_dir = os.path.join(projects_dir, program_name)
+        try:
+            artifact = dmg.build_firmware(
+                project_dir,
+                request.args.get("env") or None,
+            )
+        except BuildError as e:
+            return (
+                jsonify({"success": False, "error": str(e), "output": e.output}),
+                422,
+            )
+
+        # Read under the lock; the body is sent after it is released and a
+        # concurrent rebuild may rewrite the file
+        with open(artifact.firmware_path, "rb") as f:
+            firmware = io.BytesIO(f.read())
+        response = send_file(
+            firmware,
+            mimetype="application/octet-stream",
+            download_name=os.path.basename(artifact.firmware_path),
+            max_age=0,
+        )
+    response.headers["X-Build-Env"] = artifact.env
+    response.headers["X-Build-Worker"] = artifact.worker
+    response.headers["X-Firmware-Name"] = os.path.basename(artifact.firmware_path)
+    return response
+
+
+@app.route("/api/build_farm/stats", methods=["GET"])
+def build_farm_stats():
+    return jsonify({"success": True, "data": dmg.build_farm.stats()})
+
+
+@app.route("/api/devices/<path:port>/uploads", methods=["GET"])
+def device_uploads(port: str):
+    """Last N uploads to a port (?limit=N)"""
+    if store is None:
+        return jsonify({"success": False, "error": "State store is disabled"}), 404
+    limit = min(max(request.args.get("limit", 10, type=int), 1), 500)
+    uploads = store.recent_uploads(port, limit)
+    return jsonify({"success": True, "uploads": uploads, "count": len(uploads)})
+
+
+@app.route("/api/stats/flash_times", methods=["GET"])
+def flash_time_stats():
+    """Average build and flash time per board type"""
+    if store is None:
+        return jsonify({"success": False, "error": "State store is disabled"}), 404
+    return jsonify({"success": True, "data": store.average_flash_times()})
+
+
+@app.route("/api/metrics", methods=["GET"])
+def metrics():
+    """Admission queue depth and rejections, scheduler and build farm load"""
+    return jsonify(
+        {
+            "success": True,
+            "admission": admission.stats(),
+            "scheduler": dmg.scheduler.stats(),
+            "build_farm": dmg.build_farm.stats(),
+            "processes": dmg.supervisor.stats(),
+            "response_cache": response_cache.stats(),
+        }
+    )
+
+
+@app.route("/api/federation", methods=["GET"])
+def federation_status():
+    """Health and cache age of every federated agent"""
+    if federation is None:
+        return jsonify({"success": True, "enabled": False, "agents": []})
+    return jsonify({"success": True, "enabled": True, "agents": federation.agents()})
+
+
+@app.route("/api/scheduler/stats", methods=["GET"])
+def scheduler_stats():
+    """Scheduling latency, queue and board utilization"""
+    return jsonify({"success": True, "data": dmg.scheduler.stats()})
+
+
+@app.route("/api/bookings", methods=["GET"])
+def list_bookings():
+    bookings = [b.to_dict() for b in dmg.scheduler.bookings()]
+    return jsonify({"success": True, "bookings": bookings, "count": len(bookings)})
+
+
+@app.route("/api/bookings", methods=["POST"])
+def create_booking():
+    """Reserve a board for a time slot (start/end are unix timestamps)"""
+    data = request.get_json() or {}
+    try:
+        booking = dmg.scheduler.book(
+            user=_request_user(data),
+            port=str(data.get("port", "")).strip(),
+            start=float(data.get("start", 0)),
+            end=float(data.get("end", 0)),
+        )
+    except (TypeError, ValueError):
+        return (
+            jsonify({"success": False, "error": "start and end must be timestamps"}),
+            400,
+        )
+    except SchedulerError as e:
+        return _scheduler_error_response(e)
+    return jsonify({"success": True, "booking": booking.to_dict()}), 201
+
+
+@app.route("/api/bookings/<int:booking_id>", methods=["DELETE"])
+def delete_booking(booking_id: int):
+    data = request.get_json(silent=True) or {}
+    if not dmg.scheduler.cancel_booking(booking_id, user=_request_user(data)):
+        return jsonify({"success": False, "error": "Booking not found"}), 404
+    return jsonify({"success": True})
+
+
+@app.errorhandler(AdmissionRejectedError)
+def admission_rejected(error: AdmissionRejectedError):
+    """Shed load quickly instead of queueing without bound"""
+    logger.warning(str(error))
+    response = jsonify(
+        {
+            "success": False,
+            "error": str(error),
+            "type": "overloaded",
+            "resource": error.resource,
+            "retry_after": error.retry_after,
         }
     )
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response, 429
 
 
 @app.errorhandler(404)
@@ -287,4 +877,5 @@ def internal_error(error):
 
 def main():
     logger.info(f"Starting IoT Remote Lab server on {config.HOST}:{config.PORT}")
+    start_background_tasks(use_reloader=config.DEBUG)
     app.run(host=config.HOST, port=config.PORT, debug=config.DEBUG)
@@ -16,6 +16,39 @@ class Config:
     PLATFORMIO_TIMEOUT: int = 30
     MAX_DEVICE_SCAN_ATTEMPTS: int = 3
     DEVICE_SCAN_INTERVAL: int = 5
+    ARCHIVE_IO_WORKERS: int = 8
+    ARCHIVE_MAX_FILE_SIZE: int = 64 * 1024 * 1024
+    SCHEDULER_STUDENT_QUOTA: int = 1
+    SCHEDULER_INSTRUCTOR_QUOTA: int = 4
+    SCHEDULER_MAX_BOOKINGS: int = 2
+    SCHEDULER_WAIT_TIMEOUT: int = 300
+    INSTRUCTOR_TOKEN: str = ""
+    FEDERATION_AGENTS: str = ""
+    FEDERATION_REFRESH_INTERVAL: float = 5.0
+    FEDERATION_STALE_AFTER: float = 30.0
+    FEDERATION_TIMEOUT: float = 3.0
+    BUILD_WORKERS: int = 2
+    BUILD_REMOTE_WORKERS: str = ""
+    BUILD_AGENT_ENABLED: bool = False
+    BUILD_AGENT_TOKEN: str = ""
+    BUILD_CACHE_DIR: str = "build_cache"
+    BUILD_AFFINITY_GRACE: float = 2.0
+    ADMISSION_BUILD_CONCURRENCY: int = 0
+    ADMISSION_BUILD_QUEUE: int = 16
+    ADMISSION_BUILD_WAIT: int = 120
+    ADMISSION_FLASH_QUEUE: int = 16
+    BUILD_TIMEOUT: int = 600
+    FLASH_TIMEOUT: int = 180
+    BUILD_MEMORY_LIMIT_MB: int = 0
+    BUILD_CPU_SECONDS: int = 0
+    BUILD_CPU_QUOTA: float = 0.0
+    SUPERVISOR_CGROUP_ROOT: str = ""
+    STATE_DB_PATH: str = "lab_state.db"
+    STATE_FLUSH_INTERVAL: float = 0.5
+    RESPONSE_CACHE_SIZE: int = 256
+    WARMUP_ENABLED: bool = True
+    WARMUP_PATTERN: str = "template*"
+    INSTALL_TIMEOUT: int = 1800
 
 
 def get_config() -> Config:
@@ -27,5 +60,47 @@ def get_config() -> Config:
         LOG_LEVEL=os.getenv("LOG_LEVEL", "INFO"),
         PLATFORMIO_TIMEOUT=int(os.getenv("PLATFORMIO_TIMEOUT", "30")),
         MAX_DEVICE_SCAN_ATTEMPTS=int(os.getenv("MAX_DEVICE_SCAN_ATTEMPTS", "3")),
-        DEVICE_SCAN_INTERVAL=int(os.getenv("DEVICE_SCAN_INTERVAL", "5"))
+        DEVICE_SCAN_INTERVAL=int(os.getenv("DEVICE_SCAN_INTERVAL", "5")),
+        ARCHIVE_IO_WORKERS=int(os.getenv("ARCHIVE_IO_WORKERS", "8")),
+        ARCHIVE_MAX_FILE_SIZE=int(
+            os.getenv("ARCHIVE_MAX_FILE_SIZE", str(64 * 1024 * 1024))
+        ),
+        SCHEDULER_STUDENT_QUOTA=int(os.getenv("SCHEDULER_STUDENT_QUOTA", "1")),
+        SCHEDULER_INSTRUCTOR_QUOTA=int(os.getenv("SCHEDULER_INSTRUCTOR_QUOTA", "4")),
+        SCHEDULER_MAX_BOOKINGS=int(os.getenv("SCHEDULER_MAX_BOOKINGS", "2")),
+        SCHEDULER_WAIT_TIMEOUT=int(os.getenv("SCHEDULER_WAIT_TIMEOUT", "300")),
+        INSTRUCTOR_TOKEN=os.getenv("INSTRUCTOR_TOKEN", ""),
+        FEDERATION_AGENTS=os.getenv("FEDERATION_AGENTS", ""),
+        FEDERATION_REFRESH_INTERVAL=float(
+            os.getenv("FEDERATION_REFRESH_INTERVAL", "5")
+        ),
+        FEDERATION_STALE_AFTER=float(os.getenv("FEDERATION_STALE_AFTER", "30")),
+        FEDERATION_TIMEOUT=float(os.getenv("FEDERATION_TIMEOUT", "3")),
+        BUILD_WORKERS=int(os.getenv("BUILD_WORKERS", "2")),
+        BUILD_REMOTE_WORKERS=os.getenv("BUILD_REMOTE_WORKERS", ""),
+        BUILD_AGENT_ENABLED=os.getenv("BUILD_AGENT_ENABLED", "false").lower()
+        == "true",
+        BUILD_AGENT_TOKEN=os.getenv("BUILD_AGENT_TOKEN", ""),
+        BUILD_CACHE_DIR=os.getenv(
+            "BUILD_CACHE_DIR", os.path.join(os.getcwd(), "build_cache")
+        ),
+        BUILD_AFFINITY_GRACE=float(os.getenv("BUILD_AFFINITY_GRACE", "2")),
+        ADMISSION_BUILD_CONCURRENCY=int(os.getenv("ADMISSION_BUILD_CONCURRENCY", "0")),
+        ADMISSION_BUILD_QUEUE=int(os.getenv("ADMISSION_BUILD_QUEUE", "16")),
+        ADMISSION_BUILD_WAIT=int(os.getenv("ADMISSION_BUILD_WAIT", "120")),
+        ADMISSION_FLASH_QUEUE=int(os.getenv("ADMISSION_FLASH_QUEUE", "16")),
+        BUILD_TIMEOUT=int(os.getenv("BUILD_TIMEOUT", "600")),
+        FLASH_TIMEOUT=int(os.getenv("FLASH_TIMEOUT", "180")),
+        BUILD_MEMORY_LIMIT_MB=int(os.getenv("BUILD_MEMORY_LIMIT_MB", "0")),
+        BUILD_CPU_SECONDS=int(os.getenv("BUILD_CPU_SECONDS", "0")),
+        BUILD_CPU_QUOTA=float(os.getenv("BUILD_CPU_QUOTA", "0")),
+        SUPERVISOR_CGROUP_ROOT=os.getenv("SUPERVISOR_CGROUP_ROOT", ""),
+        STATE_DB_PATH=os.getenv(
+            "STATE_DB_PATH", os.path.join(os.getcwd(), "lab_state.db")
+        ),
+        STATE_FLUSH_INTERVAL=float(os.getenv("STATE_FLUSH_INTERVAL", "0.5")),
+        RESPONSE_CACHE_SIZE=int(os.getenv("RESPONSE_CACHE_SIZE", "256")),
+        WARMUP_ENABLED=os.getenv("WARMUP_ENABLED", "true").lower() == "true",
+        WARMUP_PATTERN=os.getenv("WARMUP_PATTERN", "template*"),
+        INSTALL_TIMEOUT=int(os.getenv("INSTALL_TIMEOUT", "1800")),
     )
\ No newline at end of file
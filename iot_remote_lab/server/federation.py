@@ -0,0 +1,397 @@
+"""
+Multi-host federation: a coordinator that aggregates agent device registries
+
+Every lab host runs the normal server and acts as an agent. A coordinator
+is started with FEDERATION_AGENTS set; it polls each agent in the background
+and serves one combined device list, routing uploads to the owning host.
+"""
+import http.client
+import json
+import logging
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+try:
+    from utils.program_archive import (iter_export_entries, program_digest,
+                                       program_exists, stream_tar)
+except ImportError:
+    from .utils.program_archive import (iter_export_entries, program_digest,
+                                        program_exists, stream_tar)
+
+logger = logging.getLogger("iot_remote_lab.federation")
+
+# Devices are published as "<port>@<agent>" so identical ports on two hosts
+# stay distinguishable
+PORT_SEPARATOR = "@"
+
+# Agent replies that mean its copy of the program must be (re)pushed
+PUSH_PROGRAM_TYPES = ("program_not_found", "program_outdated")
+
+# Headers that carry the caller's identity through to the agent's scheduler
+FORWARDED_HEADERS = ("X-Lab-User", "X-Instructor-Token")
+
+# Failures that mean the agent itself is unreachable
+TRANSPORT_ERRORS = (
+    urllib.error.URLError,
+    ConnectionError,
+    TimeoutError,
+    http.client.HTTPException,
+)
+
+
+@dataclass
+class AgentState:
+    name: str
+    url: str
+    healthy: bool = False
+    devices: list[dict] = field(default_factory=list)
+    fetched_at: float = 0.0
+    last_error: str = ""
+    failures: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "url": self.url,
+            "healthy": self.healthy,
+            "device_count": len(self.devices),
+            "age": time.monotonic() - self.fetched_at if self.fetched_at else None,
+            "last_error": self.last_error,
+        }
+
+
+def parse_agents(spec: str) -> dict[str, str]:
+    """Parse "name=url,name=url" (names default to host:port)"""
+    agents: dict[str, str] = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if "=" in item:
+            name, url = item.split("=", 1)
+        else:
+            url = item
+            name = urllib.parse.urlparse(url).netloc
+        agents[name.strip()] = url.strip().rstrip("/")
+    return agents
+
+
+def split_port(qualified: str) -> tuple[str, Optional[str]]:
+    """Split "<port>@<agent>" into (port, agent)"""
+    if PORT_SEPARATOR in qualified:
+        port, agent = qualified.rsplit(PORT_SEPARATOR, 1)
+        return port, agent
+    return qualified, None
+
+
+class FederationCoordinator:
+    """Keeps a cached view of every agent and forwards jobs to them.
+
+    Agent registries are refreshed by a background thread, so the device
+    list and port routing never wait on the network.
+    """
+
+    def __init__(
+        self,
+        agents: dict[str, str],
+        refresh_interval: float = 5.0,
+        stale_after: float = 30.0,
+        timeout: float = 3.0,
+        upload_timeout: float = 600.0,
+    ):
+        self._agents = {
+            name: AgentState(name=name, url=url) for name, url in agents.items()
+        }
+        self._refresh_interval = refresh_interval
+        self._stale_after = stale_after
+        self._timeout = timeout
+        self._upload_timeout = upload_timeout
+        self._lock = threading.Lock()
+        self._version = 0
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, len(self._agents)), thread_name_prefix="federation"
+        )
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # Background refresh
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.refresh()
+        self._thread = threading.Thread(
+            target=self._run, name="federation-refresh", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self._refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Federation refresh failed: {str(e)}")
+
+    def refresh(self):
+        """Health check and registry fetch for all agents in parallel"""
+        list(self._pool.map(self._refresh_agent, list(self._agents.values())))
+
+    def _refresh_agent(self, agent: AgentState):
+        try:
+            self._get_json(agent, "/healthz")
+            payload = self._get_json(agent, "/api/devices")
+            devices = payload.get("devices") or payload.get("data") or []
+            with self._lock:
+                if devices != agent.devices or not agent.healthy:
+                    self._version += 1
+                agent.devices = devices
+                agent.fetched_at = time.monotonic()
+                agent.healthy = True
+                agent.last_error = ""
+                agent.failures = 0
+        except Exception as e:
+            with self._lock:
+                if agent.healthy:
+                    logger.warning(f"Agent {agent.name} is unhealthy: {str(e)}")
+                    self._version += 1
+                agent.healthy = False
+                agent.last_error = str(e)
+                agent.failures += 1
+
+    # HTTP helpers
+
+    def _get_json(self, agent: AgentState, path: str) -> dict:
+        with urllib.request.urlopen(agent.url + path, timeout=self._timeout) as resp:
+            return json.loads(resp.read().decode("utf-8"))
+
+    def _post(
+        self,
+        agent: AgentState,
+        path: str,
+        body,
+        content_type: str,
+        headers: dict[str, str],
+        timeout: float,
+    ) -> tuple[dict, int]:
+        req = urllib.request.Request(
+            agent.url + path,
+            data=body,
+            method="POST",
+            headers={"Content-Type": content_type, **headers},
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                return json.loads(resp.read().decode("utf-8") or "{}"), resp.status
+        except urllib.error.HTTPError as e:
+            try:
+                payload = json.loads(e.read().decode("utf-8") or "{}")
+            except ValueError:
+                payload = {"success": False, "error": str(e)}
+            return payload, e.code
+
+    # Registry
+
+    @property
+    def version(self) -> tuple[int, tuple[bool, ...]]:
+        """Changes whenever the combined device list would change"""
+        with self._lock:
+            fresh = tuple(bool(self._fresh(a)) for a in self._agents.values())
+            return self._version, fresh
+
+    def _fresh(self, agent: AgentState) -> bool:
+        return (
+            agent.healthy
+            and agent.fetched_at
+            and time.monotonic() - agent.fetched_at <= self._stale_after
+        )
+
+    def devices(self) -> list[dict]:
+        """Combined device list with ports qualified by agent name"""
+        combined = []
+        with self._lock:
+            for agent in self._agents.values():
+                if not self._fresh(agent):
+                    continue
+                for device in agent.devices:
+                    entry = dict(device)
+                    entry["local_port"] = device.get("port", "")
+                    entry["port"] = f"{entry['local_port']}{PORT_SEPARATOR}{agent.name}"
+                    entry["host"] = agent.name
+                    combined.append(entry)
+        return combined
+
+    def agents(self) -> list[dict]:
+        with self._lock:
+            return [agent.to_dict() for agent in self._agents.values()]
+
+    def route(self, qualified_port: str) -> tuple[Optional[AgentState], str]:
+        """Find the agent owning a port; unqualified ports must be unique"""
+        port, name = split_port(qualified_port)
+        with self._lock:
+            if name is not None:
+                return self._agents.get(name), port
+            owners = [
+                agent
+                for agent in self._agents.values()
+                if self._fresh(agent)
+                and any(d.get("port") == port for d in agent.devices)
+            ]
+        return (owners[0] if len(owners) == 1 else None), port
+
+    def route_board_type(self, board_type: str) -> Optional[AgentState]:
+        """Pick the fresh agent with the most idle boards of a type"""
+        board_type = board_type.strip().lower()
+        best, best_score = None, None
+        with self._lock:
+            for agent in self._agents.values():
+                if not self._fresh(agent):
+                    continue
+                matching = [
+                    d
+                    for d in agent.devices
+                    if str(d.get("board_type", "")).lower() == board_type
+                    and d.get("status") != "disconnected"
+                ]
+                if not matching:
+                    continue
+                idle = sum(1 for d in matching if d.get("status") == "connected")
+                score = (idle, len(matching))
+                if best_score is None or score > best_score:
+                    best, best_score = agent, score
+        return best
+
+    # Jobs
+
+    def _push_program(
+        self, agent: AgentState, program_name: str, headers: dict[str, str]
+    ) -> bool:
+        """Stream a program to an agent that lacks it or has an older copy"""
+        payload, status = self._post(
+            agent,
+            "/api/programs/import?format=tar&overwrite=true",
+            stream_tar(iter_export_entries([program_name])),
+            "application/x-tar",
+            headers,
+            self._upload_timeout,
+        )
+        return status == 200 and program_name in payload.get("imported", [])
+
+    def forward_upload(
+        self, data: dict, headers: dict[str, str]
+    ) -> tuple[dict, int]:
+        """Send an upload request to the agent that owns the target board"""
+        device = data.get("device") or {}
+        qualified = str(device.get("port") or "").strip()
+        board_type = str(device.get("board_type") or "").strip()
+        if qualified:
+            agent, port = self.route(qualified)
+        else:
+            agent, port = self.route_board_type(board_type), ""
+        if agent is None:
+            target = f"port {qualified}" if qualified else f"board type {board_type}"
+            return (
+                {
+                    "success": False,
+                    "error": f"No federated host has {target}",
+                    "type": "invalid_device",
+                },
+                404,
+            )
+        if not agent.healthy:
+            return (
+                {
+                    "success": False,
+                    "error": f"Host {agent.name} is unavailable",
+                    "type": "host_unavailable",
+                },
+                503,
+            )
+
+        forwarded = {k: v for k, v in headers.items() if k in FORWARDED_HEADERS}
+        program_name = str(data.get("program_name") or "")
+        body = dict(data, device=dict(device, port=port))
+
+        try:
+            # Only push programs the coordinator has; a typo stays a 404
+            pushable = program_exists(program_name)
+            if pushable:
+                body["program_digest"] = program_digest(program_name)
+            encoded = json.dumps(body).encode("utf-8")
+            payload, status = self._post(
+                agent,
+                "/api/upload_firmware",
+                encoded,
+                "application/json",
+                forwarded,
+                self._upload_timeout,
+            )
+            if (
+                pushable
+                and payload.get("type") in PUSH_PROGRAM_TYPES
+                and self._push_program(agent, program_name, forwarded)
+            ):
+                logger.info(f"Pushed program {program_name} to {agent.name}")
+                payload, status = self._post(
+                    agent,
+                    "/api/upload_firmware",
+                    encoded,
+                    "application/json",
+                    forwarded,
+                    self._upload_timeout,
+                )
+        except TimeoutError:
+            # A read timeout only means the job ran long; the agent is still up
+            logger.warning(f"Upload forwarded to {agent.name} timed out")
+            return (
+                {
+                    "success": False,
+                    "error": f"Host {agent.name} did not answer in time",
+                    "type": "host_timeout",
+                },
+                504,
+            )
+        except TRANSPORT_ERRORS as e:
+            logger.error(f"Forwarding upload to {agent.name} failed: {str(e)}")
+            with self._lock:
+                agent.healthy = False
+                agent.last_error = str(e)
+            return (
+                {
+                    "success": False,
+                    "error": f"Host {agent.name} is unavailable",
+                    "type": "host_unavailable",
+                },
+                503,
+            )
+        except ValueError as e:
+            logger.error(f"Invalid reply from {agent.name}: {str(e)}")
+            return (
+                {
+                    "success": False,
+                    "error": f"Host {agent.name} sent an invalid reply",
+                    "type": "host_error",
+                },
+                502,
+            )
+        except OSError as e:
+            logger.error(f"Could not push program to {agent.name}: {str(e)}")
+            return (
+                {
+                    "success": False,
+                    "error": f"Could not read program {data.get('program_name')}",
+                    "type": "program_error",
+                },
+                500,
+            )
+
+        payload.setdefault("host", agent.name)
+        return payload, status
@@ -0,0 +1,497 @@
+"""
+Streaming bulk export/import of programs as tar or zip archives
+"""
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import threading
+import uuid
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional
+
+from flask import Response, current_app, jsonify, request, stream_with_context
+
+PROGRAMS_DIR = "programs"
+
+# Build output is host specific and can be regenerated, never ship it
+EXCLUDED_DIRS = {".pio", "__pycache__"}
+
+CHUNK_SIZE = 256 * 1024
+TAR_BLOCK_SIZE = tarfile.BLOCKSIZE
+
+ARCHIVE_FORMATS = {
+    "tar": "application/x-tar",
+    "zip": "application/zip",
+}
+
+_PROGRAM_NAME_RE = re.compile(r"^[A-Za-z0-9_][A-Za-z0-9_.-]*$")
+
+
+class ArchiveValidationError(ValueError):
+    """Raised when an uploaded archive contains an unsafe or invalid entry"""
+
+
+def is_valid_program_name(name: str) -> bool:
+    return bool(_PROGRAM_NAME_RE.match(name or ""))
+
+
+def _programs_dir() -> str:
+    return os.path.join(os.getcwd(), PROGRAMS_DIR)
+
+
+def program_exists(name: str) -> bool:
+    return is_valid_program_name(name) and os.path.isdir(
+        os.path.join(_programs_dir(), name)
+    )
+
+
+def _iter_program_files(program_folder: str) -> Iterator[str]:
+    """Yield every file below a program folder, skipping build output"""
+    stack = [program_folder]
+    while stack:
+        current = stack.pop()
+        with os.scandir(current) as it:
+            entries = sorted(it, key=lambda e: e.name)
+        subdirs = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in EXCLUDED_DIRS:
+                    subdirs.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry.path
+        stack.extend(reversed(subdirs))
+
+
+def iter_project_entries(
+    project_dir: str, program_name: str
+) -> Iterator[tuple[str, str]]:
+    """Yield (absolute path, archive name) pairs for one project directory"""
+    for path in _iter_program_files(project_dir):
+        relative = os.path.relpath(path, project_dir).replace(os.sep, "/")
+        yield path, f"{program_name}/{relative}"
+
+
+def iter_export_entries(program_names: Iterable[str]) -> Iterator[tuple[str, str]]:
+    """Yield (absolute path, archive name) pairs for the selected programs"""
+    programs_dir = _programs_dir()
+    for name in program_names:
+        yield from iter_project_entries(os.path.join(programs_dir, name), name)
+
+
+def program_digest(name: str) -> str:
+    """Content hash of a program as it would be exported, build output aside"""
+    digest = hashlib.sha1()
+    for path, archive_name in iter_export_entries([name]):
+        size = os.path.getsize(path)
+        digest.update(f"{archive_name}\0{size}\0".encode("utf-8"))
+        for chunk in _read_chunks(path):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to a generator"""
+
+    def __init__(self):
+        self._chunks: deque[bytes] = deque()
+
+    def write(self, data) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> Iterator[bytes]:
+        while self._chunks:
+            yield self._chunks.popleft()
+
+
+def _read_chunks(path: str) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def stream_tar(entries: Iterable[tuple[str, str]]) -> Iterator[bytes]:
+    """Stream an uncompressed tar archive one file chunk at a time.
+
+    Headers are produced by tarfile, file bodies are read straight from disk
+    so memory use does not depend on file or archive size.
+    """
+    for path, arcname in entries:
+        st = os.stat(path)
+        info = tarfile.TarInfo(arcname)
+        info.size = st.st_size
+        info.mtime = int(st.st_mtime)
+        info.mode = st.st_mode & 0o777
+        yield info.tobuf(format=tarfile.PAX_FORMAT)
+
+        written = 0
+        for chunk in _read_chunks(path):
+            # Never send more than the header announced if the file grew
+            chunk = chunk[: info.size - written]
+            written += len(chunk)
+            yield chunk
+            if written >= info.size:
+                break
+        if written < info.size:
+            raise IOError(f"{path} shrank while being archived")
+
+        remainder = info.size % TAR_BLOCK_SIZE
+        if remainder:
+            yield tarfile.NUL * (TAR_BLOCK_SIZE - remainder)
+
+    # End of archive marker
+    yield tarfile.NUL * (TAR_BLOCK_SIZE * 2)
+
+
+def stream_zip(entries: Iterable[tuple[str, str]]) -> Iterator[bytes]:
+    """Stream a stored (uncompressed) zip archive to a non seekable sink"""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as zf:
+        for path, arcname in entries:
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            with zf.open(info, mode="w") as dest:
+                for chunk in _read_chunks(path):
+                    dest.write(chunk)
+                    yield from sink.drain()
+            yield from sink.drain()
+    yield from sink.drain()
+
+
+def _resolve_selection(raw: Optional[str]) -> list[str]:
+    programs_dir = _programs_dir()
+    if not os.path.isdir(programs_dir):
+        return []
+    if raw:
+        names = [n.strip() for n in raw.split(",") if n.strip()]
+    else:
+        names = sorted(os.listdir(programs_dir))
+    return [
+        n
+        for n in names
+        if is_valid_program_name(n) and os.path.isdir(os.path.join(programs_dir, n))
+    ]
+
+
+def export_programs_archive(logger: logging.Logger) -> Response:
+    """Stream selected (or all) programs as a tar or zip archive"""
+    archive_format = request.args.get("format", "tar").lower()
+    if archive_format not in ARCHIVE_FORMATS:
+        return (
+            jsonify(
+                {
+                    "success": False,
+                    "error": f"Unsupported archive format '{archive_format}'",
+                }
+            ),
+            400,
+        )
+
+    requested = request.args.get("programs")
+    names = _resolve_selection(requested)
+    if requested and not names:
+        return jsonify({"success": False, "error": "No matching programs"}), 404
+
+    logger.info(f"Exporting {len(names)} programs as {archive_format}")
+    entries = iter_export_entries(names)
+    body = stream_tar(entries) if archive_format == "tar" else stream_zip(entries)
+
+    return Response(
+        stream_with_context(body),
+        mimetype=ARCHIVE_FORMATS[archive_format],
+        headers={
+            "Content-Disposition": f"attachment; filename=programs.{archive_format}",
+            "Cache-Control": "no-store",
+        },
+        direct_passthrough=True,
+    )
+
+
+def _safe_member_path(name: str) -> Optional[tuple[str, str]]:
+    """Split an archive member name into (program, relative path).
+
+    Returns None for entries that should be skipped (build output) and
+    raises ArchiveValidationError for anything that would escape the
+    program store.
+    """
+    normalized = name.replace("\\", "/")
+    if normalized.startswith("/") or re.match(r"^[A-Za-z]:", normalized):
+        raise ArchiveValidationError(f"Absolute path in archive: {name}")
+    parts = [p for p in normalized.split("/") if p not in ("", ".")]
+    if any(p == ".." for p in parts):
+        raise ArchiveValidationError(f"Path traversal in archive: {name}")
+    if len(parts) < 2:
+        return None
+    if not is_valid_program_name(parts[0]):
+        raise ArchiveValidationError(f"Invalid program name in archive: {parts[0]}")
+    if any(p in EXCLUDED_DIRS for p in parts[1:]):
+        return None
+    return parts[0], "/".join(parts[1:])
+
+
+class _ParallelWriter:
+    """Writes files on a thread pool while bounding in-flight bytes"""
+
+    def __init__(self, workers: int, max_inflight_bytes: int):
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="program-import"
+        )
+        self._max_inflight = max_inflight_bytes
+        self._inflight = 0
+        self._cond = threading.Condition()
+        self._futures = []
+
+    def _reserve(self, size: int):
+        with self._cond:
+            # A single oversized file is still admitted once the pool drains
+            while self._inflight and self._inflight + size > self._max_inflight:
+                self._cond.wait()
+            self._inflight += size
+
+    def _release(self, size: int):
+        with self._cond:
+            self._inflight -= size
+            self._cond.notify_all()
+
+    def submit_bytes(self, dest: str, data: bytes, mode: int):
+        self._reserve(len(data))
+
+        def task():
+            try:
+                _write_file(dest, [data], mode)
+            finally:
+                self._release(len(data))
+
+        self._futures.append(self._pool.submit(task))
+
+    def submit(self, fn, *args):
+        self._futures.append(self._pool.submit(fn, *args))
+
+    def close(self):
+        futures, self._futures = self._futures, []
+        try:
+            for future in futures:
+                future.result()
+        finally:
+            self._pool.shutdown(wait=True)
+
+    def cancel(self):
+        """Drop queued writes and wait for running ones, ignoring their errors"""
+        self._futures = []
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _write_file(dest: str, chunks: Iterable[bytes], mode: int = 0o644):
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    with open(dest, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.chmod(dest, (mode & 0o777) | 0o600)
+
+
+def _file_chunks(fileobj, limit: int) -> Iterator[bytes]:
+    total = 0
+    while True:
+        chunk = fileobj.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        total += len(chunk)
+        if total > limit:
+            raise ArchiveValidationError("Archive member exceeds size limit")
+        yield chunk
+
+
+def _unpack_tar(stream, staging: str, writer: _ParallelWriter, max_file_size: int):
+    inline_threshold = CHUNK_SIZE
+    with tarfile.open(fileobj=stream, mode="r|*") as tf:
+        for member in tf:
+            if member.isdir():
+                continue
+            if not member.isfile():
+                raise ArchiveValidationError(
+                    f"Unsupported entry type in archive: {member.name}"
+                )
+            target = _safe_member_path(member.name)
+            if target is None:
+                continue
+            if member.size > max_file_size:
+                raise ArchiveValidationError(f"{member.name} exceeds size limit")
+            dest = os.path.join(staging, target[0], *target[1].split("/"))
+            src = tf.extractfile(member)
+            if member.size <= inline_threshold:
+                writer.submit_bytes(dest, src.read(), member.mode)
+            else:
+                # Stream mode tar can only be read in order, write big files here
+                _write_file(dest, _file_chunks(src, max_file_size), member.mode)
+
+
+def _unpack_zip(stream, staging: str, writer: _ParallelWriter, max_file_size: int):
+    spool = tempfile.TemporaryFile()
+    shutil.copyfileobj(stream, spool, CHUNK_SIZE)
+    spool.seek(0)
+    zf = zipfile.ZipFile(spool)
+    try:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            target = _safe_member_path(info.filename)
+            if target is None:
+                continue
+            if info.file_size > max_file_size:
+                raise ArchiveValidationError(f"{info.filename} exceeds size limit")
+            dest = os.path.join(staging, target[0], *target[1].split("/"))
+            mode = (info.external_attr >> 16) or 0o644
+
+            def task(info=info, dest=dest, mode=mode):
+                with zf.open(info) as src:
+                    _write_file(dest, _file_chunks(src, max_file_size), mode)
+
+            writer.submit(task)
+        # Workers read from the spooled zip, wait for them before closing it
+        writer.close()
+    except BaseException:
+        writer.cancel()
+        raise
+    finally:
+        zf.close()
+        spool.close()
+
+
+def _detect_format() -> str:
+    explicit = request.args.get("format")
+    if explicit:
+        return explicit.lower()
+    content_type = (request.mimetype or "").lower()
+    if "zip" in content_type:
+        return "zip"
+    return "tar"
+
+
+def unpack_program_archive(
+    stream,
+    archive_format: str,
+    dest_root: str,
+    overwrite: bool = False,
+    workers: int = 8,
+    max_file_size: int = 64 << 20,
+    preserve: Iterable[str] = (),
+) -> tuple[list[str], list[str], list[dict]]:
+    """Unpack an archive of programs below ``dest_root``.
+
+    Each program is staged and validated before it is renamed into place.
+    Directories named in ``preserve`` (e.g. ``.pio``) are carried over from
+    a program being overwritten. Returns (imported, skipped, rejected).
+    """
+    os.makedirs(dest_root, exist_ok=True)
+    # Staging lives next to the store so the final rename stays on one filesystem
+    staging = os.path.join(dest_root, f".import-{uuid.uuid4().hex}")
+    os.makedirs(staging)
+
+    try:
+        writer = _ParallelWriter(workers, max_inflight_bytes=workers * 4 * CHUNK_SIZE)
+        try:
+            if archive_format == "tar":
+                _unpack_tar(stream, staging, writer, max_file_size)
+            else:
+                _unpack_zip(stream, staging, writer, max_file_size)
+            writer.close()
+        except BaseException:
+            # Keep the original error rather than a follow-up from a worker
+            writer.cancel()
+            raise
+
+        imported, skipped, rejected = [], [], []
+        for name in sorted(os.listdir(staging)):
+            staged = os.path.join(staging, name)
+            if not os.path.isfile(os.path.join(staged, "src", "main.cpp")):
+                rejected.append({"name": name, "error": "missing src/main.cpp"})
+                continue
+            if not os.path.isfile(os.path.join(staged, "platformio.ini")):
+                rejected.append({"name": name, "error": "missing platformio.ini"})
+                continue
+
+            final = os.path.join(dest_root, name)
+            if os.path.exists(final):
+                if not overwrite:
+                    skipped.append(name)
+                    continue
+                for keep in preserve:
+                    kept = os.path.join(final, keep)
+                    if os.path.isdir(kept):
+                        os.replace(kept, os.path.join(staged, keep))
+                shutil.rmtree(final)
+            os.replace(staged, final)
+            imported.append(name)
+
+        return imported, skipped, rejected
+
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def import_programs_archive(logger: logging.Logger) -> Response:
+    """Unpack an uploaded tar/zip archive into the program store"""
+    archive_format = _detect_format()
+    if archive_format not in ARCHIVE_FORMATS:
+        return (
+            jsonify(
+                {
+                    "success": False,
+                    "error": f"Unsupported archive format '{archive_format}'",
+                }
+            ),
+            400,
+        )
+
+    try:
+        imported, skipped, rejected = unpack_program_archive(
+            request.stream,
+            archive_format,
+            _programs_dir(),
+            overwrite=request.args.get("overwrite", "false").lower() == "true",
+            workers=int(current_app.config.get("ARCHIVE_IO_WORKERS", 8)),
+            max_file_size=int(
+                current_app.config.get("ARCHIVE_MAX_FILE_SIZE", 64 << 20)
+            ),
+        )
+
+        logger.info(
+            f"Imported {len(imported)} programs "
+            f"({len(skipped)} skipped, {len(rejected)} rejected)"
+        )
+        return jsonify(
+            {
+                "success": True,
+                "imported": imported,
+                "skipped": skipped,
+                "rejected": rejected,
+            }
+        )
+
+    except (ArchiveValidationError, tarfile.TarError, zipfile.BadZipFile) as e:
+        logger.warning(f"Rejected program archive: {str(e)}")
+        return (
+            jsonify({"success": False, "error": f"Invalid archive: {str(e)}"}),
+            400,
+        )
+
+    except Exception as e:
+        logger.error(f"Error importing programs: {str(e)}")
+        return (
+            jsonify(
+                {"success": False, "error": f"Failed to import programs: {str(e)}"}
+            ),
+            500,
+        )
@@ -10,6 +10,34 @@ PROGRAMS_DIR = "programs"
 TEMPLATE_DIR = os.path.join(PROGRAMS_DIR, "template")
 
 
+def _mtime_ns(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def program_version(program_name: str) -> tuple[int, int]:
+    """Changes whenever a program's code or metadata is rewritten"""
+    program_folder = os.path.join(os.getcwd(), PROGRAMS_DIR, program_name)
+    return (
+        _mtime_ns(os.path.join(program_folder, "src/main.cpp")),
+        _mtime_ns(os.path.join(program_folder, "metadata.json")),
+    )
+
+
+def catalog_version() -> tuple:
+    """Changes whenever a program is added, removed or rewritten"""
+    programs_dir = os.path.join(os.getcwd(), PROGRAMS_DIR)
+    if not os.path.isdir(programs_dir):
+        return ()
+    with os.scandir(programs_dir) as it:
+        names = sorted(e.name for e in it if e.is_dir())
+    return (_mtime_ns(programs_dir),) + tuple(
+        (name,) + program_version(name) for name in names
+    )
+
+
 def load_program_from_file(logger: logging.Logger, program_name: str) -> jsonify:
     # return jsonify({"success": False, "error": "Program not found"}), 404
     try:
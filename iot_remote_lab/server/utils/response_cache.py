@@ -0,0 +1,176 @@
+"""
+Response cache keyed on data versions, with strong ETags and precompression
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Hashable, Optional
+
+from flask import Response, make_response, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 512
+
+ENCODINGS = ("identity", "gzip", "br")
+
+
+def uncached(rv) -> Response:
+    """Mark a view result (e.g. an error fallback) as never to be cached"""
+    response = make_response(rv)
+    response.cache_control.no_store = True
+    return response
+
+
+class _CachedEntry:
+    """One rendered response and its lazily built encodings"""
+
+    def __init__(self, body: bytes, mimetype: str, headers: dict[str, str]):
+        self.body = body
+        self.mimetype = mimetype
+        self.headers = headers
+        self.digest = hashlib.sha1(body).hexdigest()
+        self._encoded: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def etag(self, encoding: str) -> str:
+        """Strong validators must differ between content codings"""
+        if encoding == "identity":
+            return self.digest
+        return f"{self.digest}-{encoding}"
+
+    def encoded(self, encoding: str) -> bytes:
+        if encoding == "identity":
+            return self.body
+        with self._lock:
+            data = self._encoded.get(encoding)
+            if data is None:
+                if encoding == "br":
+                    data = brotli.compress(self.body)
+                else:
+                    data = gzip.compress(self.body, compresslevel=6, mtime=0)
+                self._encoded[encoding] = data
+            return data
+
+
+class ResponseCache:
+    """LRU cache of GET responses.
+
+    The cache key is the endpoint, its view arguments and a caller supplied
+    version (device registry version, program mtimes, ...). A new version
+    simply misses; old entries age out of the LRU. Entries are compressed at
+    most once per encoding and served with a strong ETag so repeat requests
+    can be answered with 304.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self._max_entries = max_entries
+        self._entries: OrderedDict[Hashable, _CachedEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key: Hashable) -> Optional[_CachedEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry
+
+    def _put(self, key: Hashable, entry: _CachedEntry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    @staticmethod
+    def _negotiate(entry: _CachedEntry) -> str:
+        if len(entry.body) < MIN_COMPRESS_SIZE:
+            return "identity"
+        accepted = request.accept_encodings
+        if brotli is not None and accepted["br"]:
+            return "br"
+        if accepted["gzip"]:
+            return "gzip"
+        return "identity"
+
+    def _serve(self, entry: _CachedEntry) -> Response:
+        encoding = self._negotiate(entry)
+        etag_headers = {
+            "ETag": f'"{entry.etag(encoding)}"',
+            "Vary": "Accept-Encoding",
+            # Clients may keep the body but must revalidate with the ETag
+            "Cache-Control": "no-cache",
+        }
+        if any(request.if_none_match.contains(entry.etag(e)) for e in ENCODINGS):
+            return Response(status=304, headers=etag_headers)
+
+        response = Response(
+            entry.encoded(encoding),
+            status=200,
+            mimetype=entry.mimetype,
+            headers={**entry.headers, **etag_headers},
+        )
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+        return response
+
+    def cached(self, version: Callable[..., Any]):
+        """Cache a view; ``version(**view_args)`` must change with the data"""
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**view_args):
+                if request.method not in ("GET", "HEAD"):
+                    return view(**view_args)
+                key = (
+                    request.endpoint,
+                    tuple(sorted(view_args.items())),
+                    version(**view_args),
+                )
+                entry = self._get(key)
+                if entry is None:
+                    response = make_response(view(**view_args))
+                    # Errors, fallbacks and streamed bodies are served as is
+                    if (
+                        response.status_code != 200
+                        or response.is_streamed
+                        or response.cache_control.no_store
+                    ):
+                        return response
+                    headers = {
+                        k: v
+                        for k, v in response.headers.items()
+                        if k.lower() not in ("content-length", "content-type")
+                    }
+                    entry = _CachedEntry(
+                        response.get_data(), response.mimetype, headers
+                    )
+                    self._put(key, entry)
+                return self._serve(entry)
+
+            return wrapper
+
+        return decorator
@@ -0,0 +1,56 @@
+import threading
+import time
+
+import pytest
+
+from iot_remote_lab.core.admission import (AdmissionRejectedError,
+                                           ResourcePool)
+
+
+def test_rejects_when_queue_is_full():
+    pool = ResourcePool("build", limit=1, max_queue=0)
+    pool.acquire()
+
+    with pytest.raises(AdmissionRejectedError) as excinfo:
+        pool.acquire()
+    assert excinfo.value.reason == "queue full"
+    assert pool.stats()["rejected"] == 1
+
+
+def test_wait_timeout_leaves_the_queue():
+    pool = ResourcePool("build", limit=1, max_queue=1)
+    pool.acquire()
+
+    with pytest.raises(AdmissionRejectedError) as excinfo:
+        pool.acquire(timeout=0.05)
+    assert excinfo.value.reason == "wait timed out"
+    assert pool.stats()["queue_depth"] == 0
+    assert pool.stats()["timed_out"] == 1
+
+
+def test_release_hands_slot_to_oldest_waiter():
+    pool = ResourcePool("flash", limit=1, max_queue=4)
+    pool.acquire()
+    order = []
+
+    def waiter(name):
+        pool.acquire(timeout=5)
+        order.append(name)
+        pool.release()
+
+    threads = []
+    for name in ("first", "second", "third"):
+        thread = threading.Thread(target=waiter, args=(name,))
+        thread.start()
+        threads.append(thread)
+        # Make the arrival order deterministic
+        while pool.stats()["queue_depth"] < len(threads):
+            time.sleep(0.01)
+
+    pool.release()
+    for thread in threads:
+        thread.join(5)
+
+    assert order == ["first", "second", "third"]
+    assert pool.stats()["active"] == 0
+
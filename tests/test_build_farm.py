@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+
+from iot_remote_lab.core.device_manager.platformio.build_farm import (
+    BuildArtifact, BuildError, BuildFarm, BuildJob, BuildWorker,
+    WorkerUnavailableError)
+
+
+class FakeWorker(BuildWorker):
+    def __init__(self, name, capacity=1, fail_with=None, gate=None):
+        super().__init__(name, capacity)
+        self.calls = []
+        self._fail_with = fail_with
+        self._gate = gate
+
+    def build(self, job: BuildJob) -> BuildArtifact:
+        self.calls.append(job.program)
+        if self._gate is not None:
+            self._gate.wait(5)
+        if self._fail_with is not None:
+            raise self._fail_with
+        return BuildArtifact(job.program, job.env, "firmware.bin", self.name, 0.0)
+
+
+@pytest.fixture
+def project(tmp_path):
+    project_dir = tmp_path / "blink"
+    project_dir.mkdir()
+    (project_dir / "platformio.ini").write_text("[env:uno]\nplatform = atmelavr\n")
+    return str(project_dir)
+
+
+def test_concurrent_requests_share_one_build(project):
+    gate = threading.Event()
+    worker = FakeWorker("local", gate=gate)
+    farm = BuildFarm([worker])
+
+    first = farm.submit(project)
+    second = farm.submit(project)
+    gate.set()
+
+    assert first is second
+    assert first.result(5).env == "uno"
+    assert worker.calls == ["blink"]
+
+
+def test_unavailable_worker_is_retried_elsewhere(project):
+    down = FakeWorker("down", fail_with=WorkerUnavailableError("offline"))
+    up = FakeWorker("up")
+    farm = BuildFarm([down, up], affinity_grace=0.0, retry_cooldown=60.0)
+
+    artifact = farm.build(project)
+
+    assert artifact.worker == "up"
+
+
+def test_gives_up_after_max_attempts(project):
+    down = FakeWorker("down", fail_with=WorkerUnavailableError("offline"))
+    farm = BuildFarm([down], max_attempts=2, retry_cooldown=0.0)
+
+    with pytest.raises(BuildError):
+        farm.submit(project).result(5)
+    assert len(down.calls) == 2
+
+
+def test_build_errors_are_not_retried(project):
+    worker = FakeWorker("local", fail_with=BuildError("syntax error", "main.cpp:1"))
+    farm = BuildFarm([worker])
+
+    with pytest.raises(BuildError) as excinfo:
+        farm.submit(project).result(5)
+    assert excinfo.value.output == "main.cpp:1"
+    assert worker.calls == ["blink"]
+
+
+def test_farm_without_workers_fails_fast(project):
+    with pytest.raises(BuildError):
+        BuildFarm([]).submit(project).result(1)
+
+
+def test_missing_env_fails(tmp_path):
+    (tmp_path / "platformio.ini").write_text("[platformio]\n")
+
+    with pytest.raises(BuildError):
+        BuildFarm([FakeWorker("local")]).submit(str(tmp_path)).result(1)
@@ -0,0 +1,181 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+pytest.importorskip("flask")
+
+from iot_remote_lab.server.federation import (  # noqa: E402
+    FederationCoordinator, parse_agents)
+
+MAIN = "void setup() {}\nvoid loop() {}\n"
+INI = "[env:uno]\nplatform = atmelavr\n"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(url, proc, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        assert proc.poll() is None, "agent exited during startup"
+        try:
+            with urllib.request.urlopen(f"{url}/healthz", timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise AssertionError(f"agent at {url} did not start")
+
+
+def write_program(root, name, main=MAIN):
+    src = root / "programs" / name / "src"
+    src.mkdir(parents=True, exist_ok=True)
+    (src / "main.cpp").write_text(main)
+    (root / "programs" / name / "platformio.ini").write_text(INI)
+
+
+@pytest.fixture
+def agents(tmp_path):
+    """Two agents, each with its own working directory and state database"""
+    procs, urls, dirs = [], {}, {}
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(p for p in sys.path if p),
+        DEBUG="false",
+        WARMUP_ENABLED="false",
+        # No build workers, so uploads stop at the build with a 422
+        BUILD_WORKERS="0",
+        SCHEDULER_WAIT_TIMEOUT="2",
+    )
+    try:
+        for name in ("lab1", "lab2"):
+            workdir = tmp_path / name
+            (workdir / "programs").mkdir(parents=True)
+            port = free_port()
+            proc = subprocess.Popen(
+                [sys.executable, "-m", "iot_remote_lab"],
+                cwd=workdir,
+                env=dict(
+                    env,
+                    HOST="127.0.0.1",
+                    PORT=str(port),
+                    STATE_DB_PATH=str(workdir / "lab_state.db"),
+                ),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            procs.append(proc)
+            urls[name] = f"http://127.0.0.1:{port}"
+            dirs[name] = workdir
+            wait_until_up(urls[name], proc)
+        yield urls, dirs
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait(10)
+
+
+@pytest.fixture
+def coordinator(agents, tmp_path, monkeypatch):
+    urls, _ = agents
+    coordinator_dir = tmp_path / "coordinator"
+    coordinator_dir.mkdir()
+    write_program(coordinator_dir, "blink")
+    monkeypatch.chdir(coordinator_dir)
+    spec = ",".join(f"{name}={url}" for name, url in urls.items())
+    federation = FederationCoordinator(parse_agents(spec), upload_timeout=30)
+    federation.refresh()
+    yield federation, coordinator_dir
+    federation.stop()
+
+
+def upload(federation, port, program="blink"):
+    return federation.forward_upload(
+        {"device": {"port": port}, "program_name": program}, {"X-Lab-User": "alice"}
+    )
+
+
+def test_devices_of_both_agents_are_listed(coordinator):
+    federation, _ = coordinator
+
+    ports = {d["port"] for d in federation.devices()}
+
+    assert {"COM3@lab1", "COM3@lab2"} <= ports
+
+
+def test_program_is_pushed_and_repushed_after_an_edit(coordinator, agents):
+    federation, coordinator_dir = coordinator
+    _, dirs = agents
+    agent_main = dirs["lab1"] / "programs" / "blink" / "src" / "main.cpp"
+
+    payload, status = upload(federation, "COM3@lab1")
+
+    # The agent got the program and went on to build it
+    assert (status, payload["type"], payload["host"]) == (422, "build_error", "lab1")
+    assert agent_main.read_text() == MAIN
+    assert not (dirs["lab2"] / "programs" / "blink").exists()
+
+    edited = MAIN.replace("loop() {}", "loop() { delay(1); }")
+    write_program(coordinator_dir, "blink", main=edited)
+    payload, status = upload(federation, "COM3@lab1")
+
+    assert (status, payload["type"]) == (422, "build_error")
+    assert agent_main.read_text() == edited
+
+
+def test_board_type_upload_goes_to_an_agent_with_that_board(coordinator, agents):
+    federation, _ = coordinator
+    _, dirs = agents
+
+    payload, status = federation.forward_upload(
+        {"device": {"board_type": "2341:0043"}, "program_name": "blink"}, {}
+    )
+
+    assert (status, payload["type"]) == (422, "build_error")
+    assert (dirs[payload["host"]] / "programs" / "blink").is_dir()
+
+    payload, status = federation.forward_upload(
+        {"device": {"board_type": "ffff:ffff"}, "program_name": "blink"}, {}
+    )
+    assert (status, payload["type"]) == (404, "invalid_device")
+
+
+def test_unknown_program_is_not_pushed(coordinator, agents):
+    federation, _ = coordinator
+    _, dirs = agents
+
+    payload, status = upload(federation, "COM3@lab2", program="missing")
+
+    assert (status, payload["type"]) == (404, "program_not_found")
+    assert list((dirs["lab2"] / "programs").iterdir()) == []
+
+
+def test_agent_rejects_a_stale_digest(agents):
+    urls, dirs = agents
+    write_program(dirs["lab1"], "blink")
+    req = urllib.request.Request(
+        f"{urls['lab1']}/api/upload_firmware",
+        data=json.dumps(
+            {
+                "device": {"port": "COM3"},
+                "program_name": "blink",
+                "program_digest": "0" * 40,
+            }
+        ).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+
+    with pytest.raises(urllib.error.HTTPError) as excinfo:
+        urllib.request.urlopen(req, timeout=10)
+
+    assert excinfo.value.code == 409
+    assert json.loads(excinfo.value.read())["type"] == "program_outdated"
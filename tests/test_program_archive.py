@@ -0,0 +1,93 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+pytest.importorskip("flask")
+
+from iot_remote_lab.server.utils.program_archive import (  # noqa: E402
+    ArchiveValidationError, unpack_program_archive)
+
+MAIN = b"void setup() {}\nvoid loop() {}\n"
+INI = b"[env:uno]\nplatform = atmelavr\n"
+
+
+def make_tar(files):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tf:
+        for name, data in files:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    buf.seek(0)
+    return buf
+
+
+def make_zip(files):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for name, data in files:
+            zf.writestr(name, data)
+    buf.seek(0)
+    return buf
+
+
+def program_files(name):
+    return [(f"{name}/src/main.cpp", MAIN), (f"{name}/platformio.ini", INI)]
+
+
+def test_imports_valid_programs(tmp_path):
+    files = program_files("blink") + [("blink/.pio/build/uno/firmware.bin", b"x")]
+
+    imported, skipped, rejected = unpack_program_archive(
+        make_tar(files), "tar", str(tmp_path)
+    )
+
+    assert imported == ["blink"]
+    assert (tmp_path / "blink" / "src" / "main.cpp").read_bytes() == MAIN
+    assert not (tmp_path / "blink" / ".pio").exists()
+
+
+def test_existing_program_is_skipped_without_overwrite(tmp_path):
+    unpack_program_archive(make_tar(program_files("blink")), "tar", str(tmp_path))
+
+    imported, skipped, _ = unpack_program_archive(
+        make_tar(program_files("blink")), "tar", str(tmp_path)
+    )
+
+    assert imported == [] and skipped == ["blink"]
+
+
+def test_incomplete_program_is_rejected(tmp_path):
+    _, _, rejected = unpack_program_archive(
+        make_tar([("blink/src/main.cpp", MAIN)]), "tar", str(tmp_path)
+    )
+
+    assert rejected == [{"name": "blink", "error": "missing platformio.ini"}]
+
+
+@pytest.mark.parametrize(
+    "name", ["../evil/src/main.cpp", "blink/../../evil", "/etc/evil", "C:/evil"]
+)
+def test_tar_traversal_is_rejected(tmp_path, name):
+    dest = tmp_path / "programs"
+
+    with pytest.raises(ArchiveValidationError):
+        unpack_program_archive(
+            make_tar(program_files("blink") + [(name, b"x")]), "tar", str(dest)
+        )
+
+    assert not (tmp_path / "evil").exists()
+    assert list(dest.iterdir()) == []
+
+
+def test_zip_error_after_many_members_keeps_validation_error(tmp_path):
+    files = [(f"blink/src/file{i}.cpp", MAIN * 100) for i in range(50)]
+    files.append(("../evil", b"x"))
+    dest = tmp_path / "programs"
+
+    with pytest.raises(ArchiveValidationError):
+        unpack_program_archive(make_zip(files), "zip", str(dest), workers=4)
+
+    assert list(dest.iterdir()) == []
@@ -0,0 +1,92 @@
+import gzip
+
+import pytest
+
+flask = pytest.importorskip("flask")
+
+from iot_remote_lab.server.utils.response_cache import (  # noqa: E402
+    ResponseCache, uncached)
+
+BODY = "x" * 2048
+
+
+@pytest.fixture
+def setup():
+    app = flask.Flask(__name__)
+    cache = ResponseCache(max_entries=8)
+    state = {"version": 1, "calls": 0, "fail": False}
+
+    @app.route("/page")
+    @cache.cached(lambda: state["version"])
+    def page():
+        state["calls"] += 1
+        if state["fail"]:
+            return uncached(("fallback", 200))
+        return BODY
+
+    return app.test_client(), cache, state
+
+
+def test_repeat_requests_are_served_from_cache(setup):
+    client, cache, state = setup
+
+    first = client.get("/page")
+    second = client.get("/page")
+
+    assert first.get_data(as_text=True) == BODY
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert state["calls"] == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_matching_etag_gets_304(setup):
+    client, _, _ = setup
+    etag = client.get("/page").headers["ETag"]
+
+    response = client.get("/page", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.get_data() == b""
+
+
+def test_each_encoding_has_its_own_etag(setup):
+    client, _, _ = setup
+
+    identity = client.get("/page", headers={"Accept-Encoding": "identity"})
+    gzipped = client.get("/page", headers={"Accept-Encoding": "gzip"})
+
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(gzipped.get_data()).decode() == BODY
+    assert gzipped.headers["ETag"] != identity.headers["ETag"]
+    assert gzipped.headers["Vary"] == "Accept-Encoding"
+    # Either validator identifies the same body
+    response = client.get(
+        "/page",
+        headers={"Accept-Encoding": "gzip", "If-None-Match": identity.headers["ETag"]},
+    )
+    assert response.status_code == 304
+
+
+def test_new_version_misses(setup):
+    client, _, state = setup
+    etag = client.get("/page").headers["ETag"]
+    state["version"] = 2
+
+    response = client.get("/page", headers={"If-None-Match": etag})
+
+    # Same body, so the validator still matches, but the view ran again
+    assert response.status_code == 304
+    assert state["calls"] == 2
+
+
+def test_uncached_responses_are_not_stored(setup):
+    client, cache, state = setup
+    state["fail"] = True
+
+    response = client.get("/page")
+    client.get("/page")
+
+    assert response.headers["Cache-Control"] == "no-store"
+    assert "ETag" not in response.headers
+    assert state["calls"] == 2
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,140 @@
+import time
+
+import pytest
+
+from iot_remote_lab.core.admission import AdmissionRejectedError
+from iot_remote_lab.core.device_manager.platformio.model import Device
+from iot_remote_lab.core.device_manager.scheduler import (BookingConflictError,
+                                                          JobState,
+                                                          LabScheduler,
+                                                          NoMatchingDeviceError,
+                                                          PriorityClass,
+                                                          QuotaExceededError)
+
+UNO = "USB VID:PID=2341:0043 SER=1"
+
+
+def make_scheduler(devices, **options):
+    options.setdefault(
+        "quotas", {PriorityClass.INSTRUCTOR: 10, PriorityClass.STUDENT: 10}
+    )
+    return LabScheduler(lambda: devices, **options)
+
+
+def test_places_job_on_free_board():
+    board = Device("COM3", "Uno", UNO)
+    scheduler = make_scheduler([board])
+
+    job = scheduler.submit("alice", port="COM3")
+
+    assert job.state == JobState.PLACED
+    assert job.device is board
+
+
+def test_board_type_uses_every_matching_board():
+    boards = [Device("COM3", "Uno", UNO), Device("COM4", "Uno", UNO)]
+    scheduler = make_scheduler(boards)
+
+    first = scheduler.submit("alice", board_type="2341:0043")
+    second = scheduler.submit("bob", board_type="2341:0043")
+
+    assert {first.device.port, second.device.port} == {"COM3", "COM4"}
+
+
+def test_instructor_is_served_before_earlier_student():
+    scheduler = make_scheduler([Device("COM3", "Uno", UNO)])
+    holder = scheduler.submit("holder", port="COM3")
+    student = scheduler.submit("student", port="COM3")
+    instructor = scheduler.submit(
+        "instructor", priority=PriorityClass.INSTRUCTOR, port="COM3"
+    )
+
+    scheduler.release(holder)
+
+    assert instructor.state == JobState.PLACED
+    assert student.state == JobState.QUEUED
+
+
+def test_light_user_is_served_before_heavy_user():
+    scheduler = make_scheduler([Device("COM3", "Uno", UNO)])
+    heavy = scheduler.submit("heavy", port="COM3")
+    time.sleep(0.05)
+    scheduler.release(heavy)
+
+    holder = scheduler.submit("holder", port="COM3")
+    heavy_again = scheduler.submit("heavy", port="COM3")
+    light = scheduler.submit("light", port="COM3")
+    scheduler.release(holder)
+
+    assert light.state == JobState.PLACED
+    assert heavy_again.state == JobState.QUEUED
+
+
+def test_quota_rejects_extra_jobs():
+    scheduler = make_scheduler(
+        [Device("COM3", "Uno", UNO)], quotas={PriorityClass.STUDENT: 1}
+    )
+    scheduler.submit("alice", port="COM3")
+
+    with pytest.raises(QuotaExceededError):
+        scheduler.submit("alice", port="COM3")
+
+
+def test_quota_can_be_checked_before_submitting():
+    scheduler = make_scheduler(
+        [Device("COM3", "Uno", UNO)], quotas={PriorityClass.STUDENT: 1}
+    )
+    scheduler.check_quota("alice")
+    scheduler.submit("alice", port="COM3")
+
+    with pytest.raises(QuotaExceededError):
+        scheduler.check_quota("alice")
+    scheduler.check_quota("bob")
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    scheduler = make_scheduler([Device("COM3", "Uno", UNO)], max_queue=1)
+    scheduler.submit("a", port="COM3")
+    scheduler.submit("b", port="COM3")
+
+    with pytest.raises(AdmissionRejectedError) as excinfo:
+        scheduler.submit("c", port="COM3")
+    assert excinfo.value.retry_after >= 1
+
+
+def test_unknown_port_is_rejected():
+    scheduler = make_scheduler([Device("COM3", "Uno", UNO)])
+
+    with pytest.raises(NoMatchingDeviceError):
+        scheduler.submit("alice", port="COM99")
+
+
+def test_wait_for_placement_times_out_and_cancels():
+    scheduler = make_scheduler([Device("COM3", "Uno", UNO)])
+    scheduler.submit("holder", port="COM3")
+    waiting = scheduler.submit("alice", port="COM3")
+
+    assert not scheduler.wait_for_placement(waiting, 0.1)
+    assert waiting.state == JobState.CANCELLED
+
+
+def test_overlapping_booking_conflicts():
+    scheduler = make_scheduler([Device("COM3", "Uno", UNO)])
+    scheduler.book("alice", "COM3", 1000.0, 2000.0)
+
+    with pytest.raises(BookingConflictError):
+        scheduler.book("bob", "COM3", 1500.0, 2500.0)
+    # Back to back bookings do not overlap
+    scheduler.book("bob", "COM3", 2000.0, 3000.0)
+
+
+def test_active_booking_reserves_board_for_owner():
+    scheduler = make_scheduler([Device("COM3", "Uno", UNO)])
+    now = time.time()
+    scheduler.book("alice", "COM3", now - 10, now + 60)
+
+    other = scheduler.submit("bob", port="COM3")
+    owner = scheduler.submit("alice", port="COM3")
+
+    assert other.state == JobState.QUEUED
+    assert owner.state == JobState.PLACED
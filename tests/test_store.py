@@ -0,0 +1,33 @@
+import pytest
+
+from iot_remote_lab.core.device_manager.store import StateStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = StateStore(str(tmp_path / "state.db"), flush_interval=0.05)
+    yield store
+    store.close()
+
+
+def test_device_upserts_keep_latest_state(store):
+    for status in ("connected", "using"):
+        store.upsert_device("COM3", "Uno", "USB VID:PID=2341:0043", "2341:0043", status)
+    assert store.flush()
+
+    devices = store.load_devices()
+    assert [(d["port"], d["status"]) for d in devices] == [("COM3", "using")]
+
+
+def test_upload_history_and_flash_averages(store):
+    for seconds in (10.0, 20.0):
+        store.record_upload(
+            "COM3", "2341:0043", "blink", "uno", "alice", True, flash_seconds=seconds
+        )
+    store.record_upload("COM4", "0403:6001", "blink", "uno", "bob", False, "timeout")
+    assert store.flush()
+
+    assert len(store.recent_uploads("COM3", limit=1)) == 1
+    averages = {row["board_type"]: row for row in store.average_flash_times()}
+    assert averages["2341:0043"]["avg_flash_seconds"] == pytest.approx(15.0)
+    assert "0403:6001" not in averages
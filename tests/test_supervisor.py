@@ -0,0 +1,57 @@
+import sys
+import time
+
+import pytest
+
+from iot_remote_lab.core.device_manager.platformio import supervisor
+from iot_remote_lab.core.device_manager.platformio.supervisor import (
+    ProcessLimits, ProcessSupervisor)
+
+pytestmark = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="inspects /proc"
+)
+
+
+def is_running(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # Killed children may linger as zombies until init reaps them
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def run_with_timeout(script, timeout=0.5):
+    sup = ProcessSupervisor({"build": ProcessLimits(timeout=timeout)})
+    return sup.run(["sh", "-c", script], profile="build", label="test")
+
+
+def test_timeout_kills_the_whole_process_group():
+    started = time.monotonic()
+    result = run_with_timeout("sleep 60 & echo $!; wait")
+
+    assert result.exit_reason == "timeout"
+    assert time.monotonic() - started < 5
+    assert not is_running(int(result.output.split()[0]))
+
+
+def test_processes_ignoring_sigterm_are_killed(monkeypatch):
+    monkeypatch.setattr(supervisor, "KILL_GRACE", 0.2)
+
+    result = run_with_timeout("trap '' TERM; sleep 60 & echo $!; wait")
+
+    assert result.exit_reason == "timeout"
+    assert not is_running(int(result.output.split()[0]))
+
+
+def test_exit_reasons_and_output():
+    sup = ProcessSupervisor()
+
+    ok = sup.run(["sh", "-c", "echo built"])
+    failed = sup.run(["sh", "-c", "exit 3"])
+    missing = sup.run(["definitely-not-a-command"])
+
+    assert (ok.exit_reason, ok.output) == ("ok", "built\n")
+    assert (failed.exit_reason, failed.returncode) == ("error", 3)
+    assert missing.exit_reason == "not_found"
+    assert sup.stats()["exit_reasons"] == {"ok": 1, "error": 1, "not_found": 1}
@@ -0,0 +1,98 @@
+import threading
+import time
+
+from iot_remote_lab.core.device_manager.platformio.build_farm import (
+    BuildArtifact, BuildError, BuildFarm, BuildJob, BuildWorker)
+from iot_remote_lab.core.device_manager.platformio.supervisor import \
+    ProcessResult
+from iot_remote_lab.core.device_manager.platformio.warmup import (
+    ToolchainWarmer, WarmupState)
+
+
+class GatedWorker(BuildWorker):
+    def __init__(self, gate, fail=False):
+        super().__init__("local")
+        self._gate = gate
+        self._fail = fail
+
+    def build(self, job: BuildJob) -> BuildArtifact:
+        self._gate.wait(5)
+        if self._fail:
+            raise BuildError("compile failed")
+        return BuildArtifact(job.program, job.env, "firmware.bin", self.name, 0.0)
+
+
+class GatedSupervisor:
+    def __init__(self, gate, exit_reason="ok"):
+        self.commands = []
+        self._gate = gate
+        self._exit_reason = exit_reason
+
+    def run(self, command, profile, label, **_):
+        self.commands.append(command)
+        self._gate.wait(5)
+        return ProcessResult(label, command, 0, self._exit_reason)
+
+
+def make_project(root, name, platform="espressif8266"):
+    project_dir = root / name
+    project_dir.mkdir()
+    (project_dir / "platformio.ini").write_text(
+        f"[env:board]\nplatform = {platform}\n"
+    )
+    return str(project_dir)
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached in time"
+        time.sleep(0.01)
+
+
+def test_programs_become_ready_as_installs_and_builds_finish(tmp_path):
+    template = make_project(tmp_path, "template")
+    student = make_project(tmp_path, "blink")
+    other = make_project(tmp_path, "other", platform="atmelavr")
+    install_gate, build_gate = threading.Event(), threading.Event()
+    warmer = ToolchainWarmer(
+        str(tmp_path),
+        BuildFarm([GatedWorker(build_gate)]),
+        supervisor=GatedSupervisor(install_gate),
+    ).start()
+
+    wait_for(lambda: warmer.installing)
+    assert not warmer.is_ready(template)
+    assert not warmer.is_ready(student)
+    # Nothing installs packages for this platform
+    assert warmer.is_ready(other)
+
+    install_gate.set()
+    wait_for(lambda: not warmer.installing)
+    assert warmer.is_ready(student)
+    assert not warmer.is_ready(template)
+    assert warmer.status()["templates"]["template"]["state"] == "building"
+
+    build_gate.set()
+    wait_for(lambda: warmer.status()["ready"])
+    assert warmer.is_ready(template)
+    assert warmer.status()["templates"]["template"]["state"] == "ready"
+
+
+def test_failures_are_reported_without_blocking_uploads(tmp_path):
+    template = make_project(tmp_path, "template")
+    gate = threading.Event()
+    gate.set()
+    warmer = ToolchainWarmer(
+        str(tmp_path),
+        BuildFarm([GatedWorker(gate, fail=True)]),
+        supervisor=GatedSupervisor(gate, exit_reason="timeout"),
+    ).start()
+
+    wait_for(lambda: warmer.status()["ready"])
+
+    status = warmer.status()["templates"]["template"]
+    assert status["state"] == WarmupState.FAILED.value
+    assert status["error"] == "compile failed"
+    assert warmer.is_ready(template)
+    assert not warmer.installing